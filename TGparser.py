@@ -1,31 +1,139 @@
 import re
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# Ранги кандидатов: меньше - надёжнее
+RANK_STANDALONE = 0  # адрес - единственное на своей строке
+RANK_SUFFIX = 1      # адрес pump.fun / letsbonk (…pump, …bonk)
+RANK_INLINE = 2      # адрес внутри текста
+
+_SUFFIXES = ("pump", "bonk")
+
+# Один проход по сообщению: адрес, $тикер или капа - что встретится первым в позиции.
+# Адрес и ключевое слово капы начинаются только с начала слова (как раньше: соседние
+# символы не буквы/цифры) - в середине слова движок отсекает позицию сразу.
+# Число капы не укорачивается при неудачном суффиксе ("100x", "300kk" - не капа,
+# а не 10 и 30), капа в SOL ("2 SOL") не считается капой в USD.
+_SCAN_RE = re.compile(
+    r"(?<![0-9A-Za-z])(?:"
+    r"(?P<addr>[1-9A-HJ-NP-Za-km-z]{32,44}(?![0-9A-Za-z]))"
+    r"|(?i:(?:m(?:c(?:ap)?|arket\s*cap)|cap)(?![0-9A-Za-z])\s*[:=\-–—]?\s*\$?\s*"
+    r"(?P<mcap>\d[\d,]*(?:\.\d+)?)(?!\d|[.,]\d)\s*(?P<mult>[kmb])?(?![A-Za-z])(?![ \t]*sol\b)))"
+    r"|\$(?P<ticker>[A-Za-z][A-Za-z0-9_]{0,14})\b"
+)
+
+_MULTIPLIERS = {"k": 1e3, "m": 1e6, "b": 1e9}
+
+
+class ContractCandidate:
+    """Найденный в сообщении адрес: позиция и ранг"""
+    __slots__ = ('address', 'start', 'end', 'rank')
+
+    def __init__(self, address: str, start: int, end: int, rank: int):
+        self.address = address
+        self.start = start
+        self.end = end
+        self.rank = rank
+
+    def __repr__(self) -> str:
+        return f"ContractCandidate({self.address!r}, start={self.start}, rank={self.rank})"
+
+
+def _b58encode_int(value: int) -> str:
+    digits = ""
+    while value:
+        value, rest = divmod(value, 58)
+        digits = B58_ALPHABET[rest] + digits
+    return digits
+
+
+# Алфавит base58 идёт по возрастанию ASCII, поэтому у строк одной длины (без ведущих '1')
+# сравнение строк совпадает со сравнением чисел. _BYTE_BOUNDS[k] - base58 от 256**k:
+# число занимает ровно k байт, если 256**(k-1) <= число < 256**k.
+_BYTE_BOUNDS = [_b58encode_int(256 ** k) for k in range(33)]
+
+
+def _b58_less(digits: str, bound: str) -> bool:
+    return len(digits) < len(bound) or (len(digits) == len(bound) and digits < bound)
+
+
+def is_valid_pubkey(address: str) -> bool:
+    """True, если base58-строка декодируется ровно в 32 байта (публичный ключ Solana)"""
+    if not address or address.strip(B58_ALPHABET):
+        return False
+    digits = address.lstrip("1")
+    size = 32 - (len(address) - len(digits))  # ведущие '1' - нулевые байты
+    if size <= 0:
+        return size == 0 and not digits
+    return not _b58_less(digits, _BYTE_BOUNDS[size - 1]) and _b58_less(digits, _BYTE_BOUNDS[size])
+
+
+def _is_standalone(message: str, start: int, end: int) -> bool:
+    line_start = message.rfind("\n", 0, start) + 1
+    line_end = message.find("\n", end)
+    if line_end < 0:
+        line_end = len(message)
+    return not message[line_start:start].strip() and not message[end:line_end].strip()
+
+
+def _parse_mcap(number: str, mult: Optional[str]) -> Optional[float]:
+    # "1,5M" - запятая как десятичный разделитель, "120,000" - как разделитель тысяч
+    if mult and re.fullmatch(r"\d+,\d{1,2}", number):
+        number = number.replace(",", ".")
+    else:
+        number = number.replace(",", "")
+    try:
+        value = float(number)
+    except ValueError:
+        return None
+    return value * _MULTIPLIERS[mult.lower()] if mult else value
+
+
+def _scan(message: str):
+    """Один проход: (кандидаты (rank, start, end, address) в порядке появления, первый тикер, первая капа)"""
+    candidates = []
+    ticker = None
+    mcap = None
+    for match in _SCAN_RE.finditer(message):
+        kind = match.lastgroup
+        if kind == "addr":
+            address = match.group(kind)
+            if not is_valid_pubkey(address):
+                continue
+            start, end = match.span(kind)
+            if _is_standalone(message, start, end):
+                rank = RANK_STANDALONE
+            elif address.endswith(_SUFFIXES):
+                rank = RANK_SUFFIX
+            else:
+                rank = RANK_INLINE
+            candidates.append((rank, start, end, address))
+        elif kind == "ticker":
+            if ticker is None:
+                ticker = match.group(kind).upper()
+        elif mcap is None:
+            mcap = _parse_mcap(match.group("mcap"), match.group("mult"))
+    return candidates, ticker, mcap
+
+
+def find_contract_candidates(message: str) -> List[ContractCandidate]:
+    """Все валидные адреса сообщения с позициями, в порядке появления"""
+    return [ContractCandidate(address, start, end, rank) for rank, start, end, address in _scan(message)[0]]
+
 
 def find_solana_contract(message: str) -> Optional[Dict[str, object]]:
     """
     Ищет Solana-адрес в сообщении.
     Возвращает словарь с ключами contract/ticker/mcap или None.
-    Пока тикер и капу не парсим – ставим None.
+    Из нескольких адресов берём лучший по рангу (отдельная строка,
+    затем суффикс pump/bonk, затем адрес в тексте), при равенстве - первый.
+    Тикер ($TICKER) и капа (MC/mcap/market cap: 120K) - None, если их нет.
     """
-    strict_match = re.search(r'^\s*([1-9A-HJ-NP-Za-km-z]{32,44})\s*$', message, re.MULTILINE)
-    if strict_match:
-        return {"contract": strict_match.group(1).strip(),
-                "ticker":   None,
-                "mcap":     None}
-
-    pump_match = re.search(r'([1-9A-HJ-NP-Za-km-z]{32,44}pump)', message)
-    if pump_match:
-        return {"contract": pump_match.group(1),
-                "ticker":   None,
-                "mcap":     None}
-
-    general_match = re.search(r'([1-9A-HJ-NP-Za-km-z]{32,44})', message)
-    if general_match:
-        full = general_match.group(0)
-        start, end = general_match.start(), general_match.end()
-        if (start == 0 or not message[start-1].isalnum()) and \
-           (end == len(message) or not message[end].isalnum()):
-            return {"contract": full,
-                    "ticker":   None,
-                    "mcap":     None}
-    return None
\ No newline at end of file
+    candidates, ticker, mcap = _scan(message)
+    if not candidates:
+        return None
+    best = min(candidates)  # (rank, start, ...) - лучший ранг, затем первый
+    return {"contract": best[3],
+            "ticker":   ticker,
+            "mcap":     mcap}
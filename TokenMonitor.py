@@ -1,27 +1,82 @@
 import asyncio
-import aiohttp
 import json
 import websockets
 import threading
 import time
-from typing import Dict, Optional
-from config import RPC_URL, WEBSOCKET_URL, wallet_address
+from typing import Dict, List, Optional
+from config import (WEBSOCKET_URL, WEBSOCKET_STANDBY_URL, wallet_address, wallet_addresses, INGEST_WORKERS, INGEST_QUEUE_SIZE,
+                    SIGNATURE_TTL, LOG_FILTER_MODE, SWAP_PROGRAM_IDS, WS_BACKFILL_LIMIT, WS_RECONNECT_MAX)
 
-# Импортируем trade_logger
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from database.trade_logger import trade_logger
+from utils.tx_fetcher import tx_fetcher
+from utils.transport import transport
+from utils.tx_decoder import decode_swap
+from utils.log_filter import LogClassifier
+from utils.cache import ExpiringSet, ExpiringDict
+from utils.tracing import tracer
+from utils.capture import capture
+from trading.position import Position, PositionState, SellFill
+
+# Приоритеты очереди приёма (меньше - раньше)
+PRIORITY_SWAP = 0
+PRIORITY_OTHER = 1
+
+
+class WalletState:
+    """Позиции, метрики и точка добора одного отслеживаемого кошелька"""
+    __slots__ = ('address', 'active_tokens', 'last_signature', 'stats')
+
+    def __init__(self, address: str):
+        self.address = address
+        self.active_tokens: Dict[str, Position] = {}  # token_address -> Position
+        self.last_signature: Optional[str] = None     # последняя увиденная сигнатура - точка для добора пропусков
+        self.stats = {
+            'notifications': 0,  # уведомлений по подписке
+            'processed': 0,      # транзакций разобрано
+            'buys': 0,
+            'sells': 0,
+            'backfilled': 0
+        }
+
 
 class TokenMonitor:
     def __init__(self):
-        self.active_tokens: Dict[str, Dict] = {}  # token_address -> {buy_signature, buy_info, remaining_position, sell_transactions}
-        self.processed_signatures = set()
+        self.wallets: Dict[str, WalletState] = {}  # индекс владельцев: адрес кошелька -> состояние
+        self.processed_signatures = ExpiringSet(SIGNATURE_TTL)  # применённые к позициям (кошелёк, сигнатура)
+        self.inflight_signatures = set()                        # (кошелёк, сигнатура), которые сейчас разбирает воркер
+        self.seen_signatures = ExpiringSet(SIGNATURE_TTL)       # дедуп на приёме (основная/резервная подписки, добор)
         self.cache_lock = threading.Lock()
         self.websocket = None
+        self.websockets = set()        # все открытые подписки (основная + горячий резерв)
+        self.subscription_tasks = []
         self.monitoring = False
-        self.signature_timestamps = {}  # Кэш времени нахождения сигнатур
+        self.subscribed = asyncio.Event()  # первая подписка подтверждена (для прогрева при старте)
+        self.signature_timestamps = ExpiringDict(SIGNATURE_TTL)  # Кэш времени нахождения сигнатур
         self.wallet_address = None  # Будет установлен из main_test.py
+        self.wallet_addresses: List[str] = list(wallet_addresses)  # все кошельки одного монитора
+        
+        # Очередь сигнатур между приёмом с WebSocket и обработкой
+        # (приоритетная: свапы раньше прочих транзакций)
+        self.ingest_queue: Optional[asyncio.PriorityQueue] = None
+        self._ingest_seq = 0
+        self.worker_tasks = []
+        self.ingest_stats = {
+            'received': 0,            # сигнатур принято с WebSocket
+            'processed': 0,           # сигнатур обработано воркерами
+            'backpressure_waits': 0,  # сколько раз приём ждал свободного места в очереди
+            'max_depth': 0,           # максимальная глубина очереди
+            'skipped': 0,             # не-свапы, отброшенные фильтром логов
+            'low_priority': 0,        # не-свапы, поставленные в конец очереди
+            'duplicates': 0,          # сигнатуры, уже полученные другой подпиской
+            'reconnects': 0,          # переподключений WebSocket
+            'backfilled': 0           # сигнатур, добранных через getSignaturesForAddress
+        }
+        
+        # Фильтр по логам: getTransaction только для вызовов программ свапа
+        self.log_filter_mode = LOG_FILTER_MODE
+        self.log_classifier = LogClassifier(SWAP_PROGRAM_IDS)
         
         # Callback'и для уведомления о событиях
         self.on_buy_detected = None
@@ -33,98 +88,302 @@ class TokenMonitor:
             return
             
         self.monitoring = True
-        asyncio.create_task(self._monitor_websocket())
+        self.ingest_queue = asyncio.PriorityQueue(maxsize=INGEST_QUEUE_SIZE)
+        self.worker_tasks = [
+            asyncio.create_task(self._ingest_worker(i))
+            for i in range(max(1, INGEST_WORKERS))
+        ]
+        self.subscription_tasks = [asyncio.create_task(self._monitor_websocket(WEBSOCKET_URL, "основная"))]
+        if WEBSOCKET_STANDBY_URL:
+            # Горячий резерв: вторая живая подписка, при обрыве основной ничего не теряем
+            self.subscription_tasks.append(
+                asyncio.create_task(self._monitor_websocket(WEBSOCKET_STANDBY_URL, "резервная"))
+            )
         
     async def stop_monitoring(self):
         """Останавливает мониторинг"""
         self.monitoring = False
-        if self.websocket:
-            await self.websocket.close()
+        for ws in list(self.websockets):
+            await ws.close()
+        for task in self.subscription_tasks + self.worker_tasks:
+            task.cancel()
+        self.subscription_tasks = []
+        self.worker_tasks = []
+        
+    async def _enqueue_signature(self, signature: str, wallet: str, priority: int = PRIORITY_SWAP):
+        """Кладёт сигнатуру в очередь обработки. Если очередь полна - ждёт (backpressure)"""
+        self.ingest_stats['received'] += 1
+        if self.ingest_queue.full():
+            self.ingest_stats['backpressure_waits'] += 1
+        # seq сохраняет порядок прихода внутри одного приоритета
+        self._ingest_seq += 1
+        await self.ingest_queue.put((priority, self._ingest_seq, signature, wallet))
+        depth = self.ingest_queue.qsize()
+        if depth > self.ingest_stats['max_depth']:
+            self.ingest_stats['max_depth'] = depth
+            
+    async def _ingest_worker(self, worker_id: int):
+        """Воркер: забирает сигнатуры из очереди и обрабатывает транзакции"""
+        while True:
+            _, _, signature, wallet = await self.ingest_queue.get()
+            try:
+                await self._process_transaction(signature, wallet)
+            except Exception as e:
+                print(f"❌ Воркер #{worker_id}: ошибка обработки {signature[:8]}...: {e}")
+            finally:
+                self.ingest_queue.task_done()
+                self.ingest_stats['processed'] += 1
+                
+    def _classify_notification(self, tx_value: dict) -> Optional[int]:
+        """Приоритет сигнатуры по логам уведомления; None - не запрашивать вовсе"""
+        if self.log_filter_mode == "off" or self.log_classifier.is_swap(tx_value.get("logs")):
+            return PRIORITY_SWAP
+        if self.log_filter_mode == "skip":
+            self.ingest_stats['skipped'] += 1
+            return None
+        self.ingest_stats['low_priority'] += 1
+        return PRIORITY_OTHER
+        
+    async def wait_subscribed(self, timeout: float) -> bool:
+        """Ждёт подтверждения первой подписки logsSubscribe"""
+        try:
+            await asyncio.wait_for(self.subscribed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+        
+    def get_ingest_stats(self) -> dict:
+        """Возвращает счётчики очереди приёма"""
+        stats = dict(self.ingest_stats)
+        stats['depth'] = self.ingest_queue.qsize() if self.ingest_queue else 0
+        stats['workers'] = len(self.worker_tasks)
+        return stats
+        
+    def get_wallet_stats(self) -> Dict[str, dict]:
+        """Метрики по каждому кошельку отдельно"""
+        return {
+            address: dict(state.stats, open_positions=len(state.active_tokens))
+            for address, state in self.wallets.items()
+        }
             
-    async def _monitor_websocket(self):
-        """Глобальный мониторинг WebSocket"""
+    def _target_wallet(self) -> str:
+        # Используем wallet_address из main_test.py, если установлен
+        return self.wallet_address if self.wallet_address else wallet_address
+        
+    def get_wallets(self) -> List[str]:
+        """Все отслеживаемые кошельки; основной - первым"""
+        primary = self._target_wallet()
+        return [primary] + [w for w in self.wallet_addresses if w != primary]
+        
+    def _wallet_state(self, wallet: Optional[str] = None) -> WalletState:
+        """Состояние кошелька (по умолчанию - основного), создаётся при первом обращении"""
+        wallet = wallet or self._target_wallet()
+        state = self.wallets.get(wallet)
+        if state is None:
+            state = self.wallets[wallet] = WalletState(wallet)
+        return state
+        
+    @property
+    def active_tokens(self) -> Dict[str, Position]:
+        """Позиции основного кошелька (совместимость с однокошельковым API)"""
+        return self._wallet_state().active_tokens
+        
+    async def _monitor_websocket(self, url: str, label: str):
+        """Подписки logsSubscribe на все кошельки в одном соединении с переподключением: сразу, затем с растущей паузой"""
+        backoff = 0.0
         while self.monitoring:
             try:
-                async with websockets.connect(WEBSOCKET_URL) as ws:
-                    self.websocket = ws
-                    
-                    # Используем wallet_address из main_test.py, если установлен
-                    target_wallet = self.wallet_address if self.wallet_address else wallet_address
-                    
-                    sub_msg = {
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "method": "logsSubscribe",
-                        "params": [
-                            {"mentions": [target_wallet]},
-                            {"commitment": "confirmed"}
-                        ]
-                    }
-                    await ws.send(json.dumps(sub_msg))
-                    await ws.recv()  # confirm
-                    
-                    print(f"📡 Глобальный мониторинг запущен для: {target_wallet}")
-                    
-                    while self.monitoring:
-                        msg = await ws.recv()
-                        data = json.loads(msg)
+                async with websockets.connect(url) as ws:
+                    self.websockets.add(ws)
+                    if label == "основная":
+                        self.websocket = ws
+                    try:
+                        wallets = self.get_wallets()
+                        pending: Dict[int, str] = {}        # id запроса -> кошелёк (до подтверждения)
+                        subscriptions: Dict[int, str] = {}  # id подписки -> кошелёк
                         
-                        if data.get("method") != "logsNotification":
-                            continue
-                            
-                        tx_value = data.get("params", {}).get("result", {}).get("value", {})
-                        if not tx_value or tx_value.get("err"):
-                            continue
-                            
-                        signature = tx_value["signature"]
+                        for request_id, target_wallet in enumerate(wallets, start=1):
+                            pending[request_id] = target_wallet
+                            sub_msg = {
+                                "jsonrpc": "2.0",
+                                "id": request_id,
+                                "method": "logsSubscribe",
+                                "params": [
+                                    {"mentions": [target_wallet]},
+                                    {"commitment": "confirmed"}
+                                ]
+                            }
+                            await ws.send(json.dumps(sub_msg))
                         
-                        # СТОП! Сохраняем время сразу при получении сигнатуры
-                        self.signature_timestamps[signature] = time.time()
+                        print(f"📡 Глобальный мониторинг запущен для {len(wallets)} кошельк(ов): "
+                              f"{', '.join(wallets)} ({label} подписка)")
                         
-                        await self._process_transaction(signature)
+                        while self.monitoring:
+                            msg = await ws.recv()
+                            recv_time = time.time()
+                            confirmed = await self._handle_frame(msg, recv_time, pending, subscriptions)
+                            if confirmed is None:
+                                continue
+                            # Подписка живая - только теперь соединение считаем рабочим,
+                            # иначе сервер, рвущий связь после subscribe, получал бы переподключения без паузы
+                            backoff = 0.0
+                            # Добираем то, что пришло в сеть, пока подписки не было. После подтверждения -
+                            # чтобы не потерять сигнатуры между добором и включением подписки
+                            state = self._wallet_state(confirmed)
+                            if state.last_signature:
+                                asyncio.create_task(self._backfill(confirmed, state.last_signature))
+                    finally:
+                        self.websockets.discard(ws)
                         
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"🔴 Ошибка WebSocket: {e}, переподключение через 5 секунд...")
-                await asyncio.sleep(5)
+                self.ingest_stats['reconnects'] += 1
+                print(f"🔴 Ошибка WebSocket ({label}): {e}, переподключение через {backoff:.1f} с...")
+                await asyncio.sleep(backoff)
+                backoff = min(WS_RECONNECT_MAX, max(0.5, backoff * 2))
+                
+    async def _handle_frame(self, msg, recv_time: float, pending: Dict[int, str],
+                            subscriptions: Dict[int, str]) -> Optional[str]:
+        """
+        Разбирает один фрейм WebSocket: подтверждение подписки или уведомление, которое ставим в очередь.
+        Возвращает кошелёк, чья подписка только что подтверждена, иначе None
+        """
+        data = json.loads(msg)
+        
+        # Подтверждение logsSubscribe: запоминаем, какому кошельку принадлежит подписка
+        if "id" in data and data["id"] in pending:
+            target_wallet = pending.pop(data["id"])
+            if "result" in data:
+                subscriptions[data["result"]] = target_wallet
+                self.subscribed.set()
+                return target_wallet
+            print(f"❌ Подписка для {target_wallet} отклонена: {data.get('error')}")
+            return None
+        
+        if data.get("method") != "logsNotification":
+            return
+            
+        params = data.get("params", {})
+        target_wallet = subscriptions.get(params.get("subscription"))
+        if target_wallet is None:
+            return
+            
+        tx_value = params.get("result", {}).get("value", {})
+        if not tx_value or not tx_value.get("signature"):
+            return
+            
+        capture.record_frame(target_wallet, msg, recv_time)
+        signature = tx_value["signature"]
+        state = self._wallet_state(target_wallet)
+        state.last_signature = signature
+        state.stats['notifications'] += 1
+        if tx_value.get("err"):
+            return
+            
+        # Та же сигнатура уже пришла по другой подписке или через добор
+        if not self.seen_signatures.add_if_absent((target_wallet, signature)):
+            self.ingest_stats['duplicates'] += 1
+            return
+            
+        # СТОП! Сохраняем время получения фрейма, а не начала обработки
+        self.signature_timestamps.setdefault(signature, recv_time)
+        
+        priority = self._classify_notification(tx_value)
+        if priority is None:
+            return
+        
+        # Только кладём в очередь - разбор делают воркеры
+        await self._enqueue_signature(signature, target_wallet, priority)
+        
+    async def _backfill(self, target_wallet: str, until_signature: str):
+        """Добирает сигнатуры кошелька после until_signature через getSignaturesForAddress и пускает их обычным путём"""
+        try:
+            entries = await transport.rpc_call("getSignaturesForAddress", [
+                target_wallet,
+                {"until": until_signature, "limit": WS_BACKFILL_LIMIT, "commitment": "confirmed"}
+            ])
+        except Exception as e:
+            print(f"❌ Не удалось добрать пропущенные сигнатуры {target_wallet}: {e}")
+            return
+            
+        missed = 0
+        # RPC отдаёт от новых к старым - обрабатываем в порядке появления в сети
+        for entry in reversed(entries or []):
+            signature = entry.get("signature")
+            if not signature or entry.get("err"):
+                continue
+            if not self.seen_signatures.add_if_absent((target_wallet, signature)):
+                continue
+            self.signature_timestamps.setdefault(signature, time.time())
+            missed += 1
+            # Логов у добранных сигнатур нет - не фильтруем, дедуп отсеет повторы
+            await self._enqueue_signature(signature, target_wallet, PRIORITY_SWAP)
+            
+        if missed:
+            self.ingest_stats['backfilled'] += missed
+            self._wallet_state(target_wallet).stats['backfilled'] += missed
+            print(f"🔁 Добрано пропущенных сигнатур для {target_wallet}: {missed}")
                 
-    async def _process_transaction(self, signature: str):
-        """Обрабатывает транзакцию и определяет, к какому токену она относится"""
-        # Проверяем кэш
+    async def _process_transaction(self, signature: str, wallet: Optional[str] = None):
+        """Обрабатывает транзакцию кошелька и определяет, к какому токену она относится"""
+        state = self._wallet_state(wallet)
+        
+        key = (state.address, signature)
+        
+        # Проверяем кэш (одна транзакция может касаться нескольких наших кошельков).
+        # Обработанной сигнатура считается только после применения к позиции
         with self.cache_lock:
-            if signature in self.processed_signatures:
+            if key in self.processed_signatures or key in self.inflight_signatures:
                 return
-            self.processed_signatures.add(signature)
-        
-        print(f"🔍 Обрабатываем транзакцию: {signature[:8]}...")
+            self.inflight_signatures.add(key)
+        try:
+            if await self._apply_transaction(signature, state):
+                self.processed_signatures.add(key)
+        finally:
+            self.inflight_signatures.discard(key)
+            
+    async def _apply_transaction(self, signature: str, state: WalletState) -> bool:
+        """Разбирает транзакцию и применяет её к позиции. True - применена"""
+        print(f"🔍 Обрабатываем транзакцию: {signature[:8]}... (кошелёк {state.address[:8]}...)")
+        state.stats['processed'] += 1
+        active_tokens = state.active_tokens
         
         # Получаем детали транзакции
-        tx_info = await self._get_transaction_details(signature)
+        with tracer.span('tx_fetch_decode'):
+            tx_info = await self._get_transaction_details(signature, state.address)
         if not tx_info:
             print(f"❌ Не удалось получить детали транзакции: {signature[:8]}...")
-            return
+            # Даём добору после переподключения принести сигнатуру ещё раз
+            self.seen_signatures.discard((state.address, signature))
+            return False
             
         token_address = tx_info.get('token_address')
         direction = tx_info.get('direction')
         
         print(f"🔍 Транзакция {signature[:8]}... | Токен: {token_address[:8] if token_address else 'N/A'} | Направление: {direction}")
-        print(f"🔍 Отслеживаемые токены: {list(self.active_tokens.keys())}")
+        print(f"🔍 Отслеживаемые токены: {list(active_tokens.keys())}")
         
         # Проверяем, отслеживается ли этот токен
-        if token_address not in self.active_tokens:
+        if token_address not in active_tokens:
             print(f"❌ Токен {token_address[:8] if token_address else 'N/A'} не отслеживается")
-            return
+            return False
             
-        token_data = self.active_tokens[token_address]
+        position = active_tokens[token_address]
         
-        if direction == 'buy' and 'buy_signature' not in token_data:
-            # Это покупка для отслеживаемого токена
+        if direction == 'buy' and position.state == PositionState.WAITING_BUY:
+            # Это покупка для отслеживаемого токена (open() будит ожидающих покупку
+            # и применяет продажи, разобранные раньше неё)
             token_amount = tx_info.get('token_amount', 0.0)
-            token_data['buy_signature'] = signature
-            token_data['buy_info'] = tx_info
-            token_data['remaining_position'] = token_amount
-            token_data['sell_transactions'] = []
+            early_sells = len(position.pending_sells)
+            position.open(signature, token_amount,
+                          tx_info.get('sol_spent_wallet', 0.0),
+                          tx_info.get('sol_spent_pure'))
+            state.stats['buys'] += 1
             
             print(f"✅ Покупка найдена для токена {token_address[:8]}... | Количество: {token_amount:.6f}")
+            if early_sells:
+                print(f"🔁 Применено отложенных продаж: {early_sells} | Осталось: {position.remaining_position:.6f}")
             
             # Вызываем callback если установлен
             if self.on_buy_detected:
@@ -132,30 +391,34 @@ class TokenMonitor:
                     await self.on_buy_detected(signature, token_address)
                 except Exception as e:
                     print(f"❌ Ошибка в callback покупки: {e}")
-
+            return True
             
         elif direction == 'sell':
             # Это продажа для отслеживаемого токена
             token_amount = tx_info.get('token_amount', 0.0)
             
-            # Проверяем, что покупка уже была найдена
-            if 'remaining_position' not in token_data:
-                print(f"🔍 Продажа {signature[:8]}... для {token_address[:8]}... но remaining_position не найден. Токен: {list(token_data.keys())}")
-                return
-                
-            # Добавляем продажу в список транзакций
-            sell_tx = {
-                'signature': signature,
-                'info': tx_info,
-                'amount': token_amount
-            }
-            token_data['sell_transactions'].append(sell_tx)
+            fill = SellFill(signature, token_amount,
+                            tx_info.get('sol_received_wallet', 0.0),
+                            tx_info.get('sol_received_pure'))
             
-            # Уменьшаем оставшуюся позицию
-            token_data['remaining_position'] -= token_amount
+            # Покупка ещё не разобрана (например, ушла на повтор getTransaction) -
+            # откладываем продажу, open() применит её
+            if position.state == PositionState.WAITING_BUY:
+                position.add_sell(fill)
+                state.stats['sells'] += 1
+                print(f"⏳ Продажа {signature[:8]}... для {token_address[:8]}... пришла раньше покупки - отложена")
+                return True
+            if position.state != PositionState.OPEN:
+                print(f"🔍 Продажа {signature[:8]}... для {token_address[:8]}... но позиция в состоянии {position.state}")
+                return False
+                
+            # Добавляем продажу и уменьшаем оставшуюся позицию
+            # (при полной продаже add_sell переводит позицию в CLOSED и будит ожидающих)
+            position.add_sell(fill)
+            state.stats['sells'] += 1
             
             # Получаем данные о цене и капе для лога
-            sell_price_info = await self._get_sell_price_info(tx_info, token_data)
+            sell_price_info = await self._get_sell_price_info(tx_info, position)
             if sell_price_info:
                 sell_mcap = sell_price_info.get('mcap', 0)
                 entry_mcap = sell_price_info.get('entry_mcap', 0)
@@ -163,9 +426,9 @@ class TokenMonitor:
                 
                 # Логирование продаж перенесено в Wizard_trader.py для избежания дублирования
                 
-                print(f"✅ Продажа найдена для токена {token_address[:8]}... | Продано: {token_amount:.6f} | Осталось: {token_data['remaining_position']:.6f} | Капа: {sell_mcap:,.0f} ({mcap_change_percent:+.1f}%)")
+                print(f"✅ Продажа найдена для токена {token_address[:8]}... | Продано: {token_amount:.6f} | Осталось: {position.remaining_position:.6f} | Капа: {sell_mcap:,.0f} ({mcap_change_percent:+.1f}%)")
             else:
-                print(f"✅ Продажа найдена для токена {token_address[:8]}... | Продано: {token_amount:.6f} | Осталось: {token_data['remaining_position']:.6f}")
+                print(f"✅ Продажа найдена для токена {token_address[:8]}... | Продано: {token_amount:.6f} | Осталось: {position.remaining_position:.6f}")
             
             # Вызываем callback если установлен
             if self.on_sell_detected:
@@ -174,223 +437,27 @@ class TokenMonitor:
                 except Exception as e:
                     print(f"❌ Ошибка в callback продажи: {e}")
             
-            # Если позиция полностью продана, удаляем токен из мониторинга
-            if token_data['remaining_position'] <= 0:
-                print(f"🎯 Позиция полностью продана для токена {token_address[:8]}... | Всего продаж: {len(token_data['sell_transactions'])}")
+            if position.state == PositionState.CLOSED:
+                print(f"🎯 Позиция полностью продана для токена {token_address[:8]}... | Всего продаж: {len(position.sells)}")
                 
                 # Финализация сделки перенесена в Wizard_trader.py для избежания дублирования
-
+            return True
             
-    async def _get_transaction_details(self, signature: str, retries: int = 15, delay: float = 1.0):
-        """Получает детали транзакции"""
-        for attempt in range(retries):
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "jsonrpc": "2.0",
-                    "id": 1,
-                    "method": "getTransaction",
-                    "params": [
-                        signature,
-                        {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
-                    ]
-                }
-                
-                try:
-                    async with session.post(RPC_URL, json=payload, timeout=10) as resp:
-                        if resp.status != 200:
-                            await asyncio.sleep(delay)
-                            continue
-                            
-                        data = await resp.json()
-                        result = data.get("result")
-                        if not result:
-                            await asyncio.sleep(delay)
-                            continue
-                            
-                        meta = result.get("meta")
-                        if not meta or meta.get("err"):
-                            return None
-                            
-                        try:
-                            keys = result["transaction"]["message"]["accountKeys"]
-                            accounts = [a["pubkey"] for a in keys]
-                            
-                            # Используем wallet_address из main_test.py, если установлен
-                            target_wallet = self.wallet_address if self.wallet_address else wallet_address
-                            
-                            if target_wallet not in accounts:
-                                return None
-                                
-                            idx = accounts.index(target_wallet)
-                            sol_change = (meta["postBalances"][idx] - meta["preBalances"][idx]) / 1e9
-                        except (KeyError, ValueError, IndexError) as e:
-                            return None
-                            
-                        pre_tokens = {
-                            b["mint"]: float(b["uiTokenAmount"].get("uiAmountString", "0.0"))
-                            for b in meta.get("preTokenBalances", [])
-                            if b.get("owner") == target_wallet
-                        }
-                        
-                        for post in meta.get("postTokenBalances", []):
-                            if post.get("owner") != target_wallet:
-                                continue
-                                
-                            mint = post["mint"]
-                            post_amt = float(post["uiTokenAmount"].get("uiAmountString", "0.0"))
-                            pre_amt = pre_tokens.get(mint, 0.0)
-                            delta = post_amt - pre_amt
-                            
-                            if delta > 0 and sol_change < 0:  # Покупка
-                                pure_sol_swap = self._extract_pure_sol_swap(meta, "buy")
-                                return {
-                                    "direction": "buy",
-                                    "signature": signature,
-                                    "token_address": mint,
-                                    "token_amount": delta,
-                                    "sol_spent_wallet": abs(sol_change),
-                                    "sol_spent_pure": pure_sol_swap
-                                }
-                                
-                            if delta < 0:  # Продажа
-                                # Используем логику из test.py для парсинга продаж
-                                swap_details = self._parse_swap_transaction(result, wallet_address)
-                                sol_received = 0.0
-                                
-                                # Ищем SOL в полученных токенах
-                                for received in swap_details.get("received", []):
-                                    if received["mint"] == "So11111111111111111111111111111111111111112":
-                                        sol_received = received["amount_received"]
-                                        break
-                                
-                                return {
-                                    "direction": "sell",
-                                    "signature": signature,
-                                    "token_address": mint,
-                                    "token_amount": abs(delta),
-                                    "sol_received_wallet": sol_change,
-                                    "sol_received_pure": sol_received
-                                }
-                        
-                        return None
-                        
-                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    await asyncio.sleep(delay)
-                    
-        return None
-        
-    def _parse_swap_transaction(self, result, user_wallet_address: str) -> dict:
-        """
-        Парсит транзакцию свапа и возвращает, какие токены были отправлены
-        и получены пользователем (логика из test.py).
-        """
-        try:
-            meta = result.get('meta')
-            if not meta:
-                return {"sent": [], "received": []}
-
-            pre_balances = meta.get('preTokenBalances', [])
-            post_balances = meta.get('postTokenBalances', [])
-
-            # Создаем карту балансов ДО для всех счетов
-            pre_balances_map = {
-                item['accountIndex']: {
-                    'mint': item['mint'],
-                    'owner': item.get('owner'),
-                    'amount': float(item['uiTokenAmount']['uiAmountString'])
-                }
-                for item in pre_balances if item.get('uiTokenAmount', {}).get('uiAmountString')
-            }
-
-            sent_tokens = []
-            received_tokens = []
-
-            # Проходим по балансам ПОСЛЕ
-            for post_bal in post_balances:
-                account_index = post_bal.get('accountIndex')
-                owner = post_bal.get('owner')
-                post_amount_str = post_bal.get('uiTokenAmount', {}).get('uiAmountString')
-                
-                if not post_amount_str or account_index not in pre_balances_map:
-                    continue
-
-                pre_bal_info = pre_balances_map[account_index]
-                pre_amount = pre_bal_info['amount']
-                post_amount = float(post_amount_str)
-                amount_change = post_amount - pre_amount
-
-                # Ищем только значительные изменения
-                if abs(amount_change) > 1e-9:
-                    # Если баланс УМЕНЬШИЛСЯ
-                    if amount_change < 0:
-                        # Если это кошелек пользователя - значит, он ОТДАЛ токены
-                        if owner == user_wallet_address:
-                            amount_sent = abs(amount_change)
-                            sent_tokens.append({
-                                "mint": post_bal['mint'],
-                                "amount_sent": amount_sent
-                            })
-                        # Если это НЕ кошелек пользователя - значит, он ПОЛУЧИЛ токены от DEX
-                        else:
-                            amount_received = abs(amount_change)
-                            received_tokens.append({
-                                "mint": post_bal['mint'],
-                                "amount_received": amount_received
-                            })
-            
-            return {"sent": sent_tokens, "received": received_tokens}
-
-        except Exception as e:
-            return {"sent": [], "received": []}
-        
-    def _extract_pure_sol_swap(self, meta, direction: str):
-        """
-        Извлекает "чистую" сумму SOL из свапа, анализируя внутренние инструкции.
-        - Для 'buy': ищет перевод SOL, где наш кошелек является 'authority'.
-        - Для 'sell': ищет временные wSOL аккаунты, принадлежащие нам, и находит перевод на них.
-        """
-        try:
-            wsol_mint = "So11111111111111111111111111111111111111112"
-            inner_instructions = meta.get("innerInstructions", [])
+        return False
             
-            # Используем wallet_address из main_test.py, если установлен
-            target_wallet = self.wallet_address if self.wallet_address else wallet_address
-
-            if direction == "buy":
-                for ix in inner_instructions:
-                    for inst in ix.get("instructions", []):
-                        parsed = inst.get("parsed", {})
-                        if inst.get("program") == "spl-token" and parsed.get("type") == "transferChecked":
-                            info = parsed.get("info", {})
-                            if info.get("mint") == wsol_mint and info.get("authority") == target_wallet:
-                                return float(info.get("tokenAmount", {}).get("uiAmount", 0.0))
-
-            elif direction == "sell":
-                # Шаг 1: Найти все временные wSOL-аккаунты, принадлежащие нашему кошельку.
-                owned_temp_wsol_accounts = set()
-                for ix in inner_instructions:
-                    for inst in ix.get("instructions", []):
-                        parsed = inst.get("parsed", {})
-                        if parsed.get("type") in ["initializeAccount", "initializeAccount3"]:
-                            info = parsed.get("info", {})
-                            if info.get("owner") == target_wallet and info.get("mint") == wsol_mint:
-                                owned_temp_wsol_accounts.add(info.get("account"))
-
-                # Шаг 2: Найти перевод wSOL на один из этих временных аккаунтов.
-                if owned_temp_wsol_accounts:
-                    for ix in inner_instructions:
-                        for inst in ix.get("instructions", []):
-                            parsed = inst.get("parsed", {})
-                            if inst.get("program") == "spl-token" and parsed.get("type") == "transferChecked":
-                                info = parsed.get("info", {})
-                                if info.get("mint") == wsol_mint and info.get("destination") in owned_temp_wsol_accounts:
-                                    return float(info.get("tokenAmount", {}).get("uiAmount", 0.0))
-
-        except Exception as e:
-            pass
-        return None
+    async def _get_transaction_details(self, signature: str, target_wallet: Optional[str] = None):
+        """Получает детали транзакции (запрос идёт через batch-загрузчик tx_fetcher)"""
+        result = await tx_fetcher.fetch(signature)
+        if not result:
+            return None
+            
+        # По умолчанию - основной кошелёк (wallet_address из main_test.py, если установлен)
+        target_wallet = target_wallet or self._target_wallet()
+        
+        swap = decode_swap(result, signature, target_wallet)
+        return swap.to_dict() if swap else None
         
-    async def _get_sell_price_info(self, sell_tx_info: dict, token_data: dict) -> Optional[dict]:
+    async def _get_sell_price_info(self, sell_tx_info: dict, position: Position) -> Optional[dict]:
         """Получает информацию о цене и капе для продажи"""
         try:
             from utils.onchain import get_sol_price, get_token_supply
@@ -403,131 +470,179 @@ class TokenMonitor:
                 return None
                 
             # Получаем цену SOL и supply токена
-            async with aiohttp.ClientSession() as session:
-                sol_price = await get_sol_price(session)
-                token_supply = await get_token_supply(sell_tx_info.get('token_address'))
-                
-                if not sol_price or not token_supply:
-                    return None
-                    
-                # Рассчитываем цену и капу продажи
-                sell_price = sol_pure / token_amount
-                price_in = sell_price * sol_price
-                sell_mcap = price_in * token_supply
+            sol_price = await get_sol_price()
+            token_supply = await get_token_supply(sell_tx_info.get('token_address'))
+            
+            if not sol_price or not token_supply:
+                return None
                 
-                # Получаем капу входа из WL_trader (если доступна)
-                entry_mcap = token_data.get('entry_mcap', 0)
+            # Рассчитываем цену и капу продажи
+            sell_price = sol_pure / token_amount
+            price_in = sell_price * sol_price
+            sell_mcap = price_in * token_supply
+            
+            # Получаем капу входа из WL_trader (если доступна)
+            entry_mcap = position.entry_mcap
+            
+            # Рассчитываем изменение капы
+            if entry_mcap and entry_mcap > 0:
+                mcap_change_percent = ((sell_mcap - entry_mcap) / entry_mcap) * 100
+            else:
+                mcap_change_percent = 0
                 
-                # Рассчитываем изменение капы
-                if entry_mcap and entry_mcap > 0:
-                    mcap_change_percent = ((sell_mcap - entry_mcap) / entry_mcap) * 100
-                else:
-                    mcap_change_percent = 0
-                    
-                return {
-                    'mcap': sell_mcap,
-                    'entry_mcap': entry_mcap,
-                    'mcap_change_percent': mcap_change_percent
-                }
+            return {
+                'mcap': sell_mcap,
+                'entry_mcap': entry_mcap,
+                'mcap_change_percent': mcap_change_percent
+            }
                 
         except Exception as e:
             return None
         
-    def add_token(self, token_address: str):
-        """Добавляет токен для отслеживания"""
-        self.active_tokens[token_address] = {}
-        print(f"📝 Добавлен токен для отслеживания: {token_address[:8]}... (всего: {len(self.active_tokens)})")
+    def add_token(self, token_address: str, ticker: Optional[str] = None, wallet: Optional[str] = None) -> Position:
+        """Добавляет токен для отслеживания на кошельке (по умолчанию - основном)"""
+        active_tokens = self._wallet_state(wallet).active_tokens
+        existing = active_tokens.get(token_address)
+        if existing is not None:
+            # Не затираем живую позицию - ожидающие её события остались бы висеть
+            print(f"⚠️ Токен {token_address[:8]}... уже отслеживается ({existing.state})")
+            return existing
+        position = Position(token_address, ticker)
+        active_tokens[token_address] = position
+        print(f"📝 Добавлен токен для отслеживания: {token_address[:8]}... (всего: {len(active_tokens)})")
+        return position
+        
+    def add_token_everywhere(self, token_address: str, ticker: Optional[str] = None) -> Dict[str, Position]:
+        """Ставит токен на отслеживание на всех кошельках: Wizard может купить с любого из них"""
+        return {wallet: self.add_token(token_address, ticker, wallet) for wallet in self.get_wallets()}
+        
+    def remove_token_everywhere(self, token_address: str, keep_wallet: Optional[str] = None):
+        """Снимает токен со всех кошельков, кроме keep_wallet"""
+        for wallet in list(self.wallets):
+            if wallet != keep_wallet:
+                self.remove_token(token_address, wallet)
+        
+    def get_position(self, token_address: str, wallet: Optional[str] = None) -> Optional[Position]:
+        """Возвращает отслеживаемую позицию или None"""
+        return self._wallet_state(wallet).active_tokens.get(token_address)
         
-    def remove_token(self, token_address: str):
+    def remove_token(self, token_address: str, wallet: Optional[str] = None):
         """Удаляет токен из отслеживания"""
-        if token_address in self.active_tokens:
-            del self.active_tokens[token_address]
+        position = self._wallet_state(wallet).active_tokens.pop(token_address, None)
+        # Будим всех ожидающих - они увидят, что токен больше не отслеживается
+        if position:
+            position.cancel()
             
-    async def wait_for_buy_signature_only(self, token_address: str, timeout: float = 60.0) -> Optional[str]:
-        """Ждет только сигнатуру покупки (без деталей транзакции)"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if token_address in self.active_tokens:
-                token_data = self.active_tokens[token_address]
-                if 'buy_signature' in token_data:
-                    return token_data['buy_signature']
-            await asyncio.sleep(0.1)
+    async def _wait_event(self, token_address: str, name: str, timeout: float, wallet: Optional[str] = None) -> bool:
+        """Ждет событие позиции ('buy' или 'closed') без опроса. False - таймаут или токен не отслеживается"""
+        position = self.get_position(token_address, wallet)
+        if position is None:
+            return False
+        event = position.buy_event if name == 'buy' else position.closed_event
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+            
+    async def wait_for_buy_any_wallet(self, token_address: str, timeout: Optional[float] = 60.0) -> Optional[str]:
+        """
+        Ждет покупку токена на любом кошельке, где он отслеживается.
+        Возвращает кошелёк покупки (позиции на остальных снимаются) или None - таймаут
+        """
+        waiters = {}
+        for wallet, state in self.wallets.items():
+            position = state.active_tokens.get(token_address)
+            if position is not None:
+                waiters[asyncio.ensure_future(position.buy_event.wait())] = wallet
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            while waiters:
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(waiters, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    wallet = waiters.pop(task)
+                    position = self.get_position(token_address, wallet)
+                    # Событие будит и снятие позиции - тогда ждём остальные кошельки
+                    if position is not None and position.is_bought:
+                        self.remove_token_everywhere(token_address, keep_wallet=wallet)
+                        return wallet
+        finally:
+            for task in waiters:
+                task.cancel()
         return None
+            
+    async def wait_for_buy_signature_only(self, token_address: str, timeout: float = 60.0,
+                                          wallet: Optional[str] = None) -> Optional[str]:
+        """Ждет только сигнатуру покупки (без деталей транзакции)"""
+        await self._wait_event(token_address, 'buy', timeout, wallet)
+        position = self.get_position(token_address, wallet)
+        return position.buy_signature if position else None
         
-    async def wait_for_buy(self, token_address: str, timeout: float = 60.0) -> Optional[dict]:
+    async def wait_for_buy(self, token_address: str, timeout: float = 60.0,
+                           wallet: Optional[str] = None) -> Optional[dict]:
         """Ждет покупку для конкретного токена"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if token_address in self.active_tokens:
-                token_data = self.active_tokens[token_address]
-                if 'buy_signature' in token_data:
-                    return token_data['buy_info']
-            await asyncio.sleep(0.1)
-        return None
+        await self._wait_event(token_address, 'buy', timeout, wallet)
+        position = self.get_position(token_address, wallet)
+        return position.buy_info() if position else None
         
     def get_signature_time(self, signature: str) -> Optional[float]:
         """Возвращает время нахождения сигнатуры"""
         return self.signature_timestamps.get(signature)
         
-    async def wait_for_all_sells(self, token_address: str, timeout: float = 21600.0) -> list:
+    async def wait_for_all_sells(self, token_address: str, timeout: float = 21600.0,
+                                 wallet: Optional[str] = None) -> List[SellFill]:
         """Ждет все продажи для конкретного токена до полной продажи позиции"""
-        start_time = time.time()
         print(f"🔍 Начинаем ожидание продаж для токена {token_address[:8]}...")
         
-        while time.time() - start_time < timeout:
-            if token_address in self.active_tokens:
-                token_data = self.active_tokens[token_address]
-                
-                # Проверяем, полностью ли продана позиция
-                if token_data.get('remaining_position', 0) <= 0:
-                    sell_transactions = token_data.get('sell_transactions', [])
-                    print(f"✅ Позиция завершена для токена {token_address[:8]}... | Продаж: {len(sell_transactions)} | remaining_position: {token_data.get('remaining_position', 0)}")
-                    # Удаляем токен из мониторинга после возврата транзакций
-                    self.remove_token(token_address)
-                    return sell_transactions
-                    
-            else:
-                # Токен больше не отслеживается - позиция полностью продана
-                print(f"❌ Токен {token_address[:8]}... больше не отслеживается")
-                return []
-                
-            await asyncio.sleep(0.1)
+        await self._wait_event(token_address, 'closed', timeout, wallet)
+        
+        position = self.get_position(token_address, wallet)
+        if position is None:
+            # Токен больше не отслеживается - позиция полностью продана
+            print(f"❌ Токен {token_address[:8]}... больше не отслеживается")
+            return []
+            
+        # Проверяем, полностью ли продана позиция
+        if position.state == PositionState.CLOSED:
+            print(f"✅ Позиция завершена для токена {token_address[:8]}... | Продаж: {len(position.sells)} | remaining_position: {position.remaining_position}")
+            # Удаляем токен из мониторинга после возврата транзакций
+            self.remove_token(token_address, wallet)
+            return position.sells
         
         print(f"⏰ Таймаут ожидания продаж для токена {token_address[:8]}...")
         return []
     
-    async def wait_for_buy_transaction(self, token_address: str, timeout: float = 60.0) -> Optional[dict]:
+    async def wait_for_buy_transaction(self, token_address: str, timeout: float = 60.0,
+                                       wallet: Optional[str] = None) -> Optional[dict]:
         """Ждет покупку для конкретного токена и возвращает детали транзакции"""
-        start_time = time.time()
         print(f"🔍 Начинаем ожидание покупки для токена {token_address[:8]}...")
         
-        while time.time() - start_time < timeout:
-            if token_address in self.active_tokens:
-                token_data = self.active_tokens[token_address]
-                
-                # Проверяем, найдена ли покупка
-                if 'buy_signature' in token_data:
-                    buy_info = token_data.get('buy_info', {})
-                    buy_signature = token_data.get('buy_signature', '')
-                    token_amount = token_data.get('remaining_position', 0)
-                    
-                    print(f"✅ Покупка найдена для токена {token_address[:8]}... | Сигнатура: {buy_signature[:8]}... | Количество: {token_amount:.6f}")
-                    
-                    # Возвращаем детали покупки
-                    return {
-                        'signature': buy_signature,
-                        'token_address': token_address,
-                        'token_amount': token_amount,
-                        'buy_info': buy_info,
-                        'timestamp': self.get_signature_time(buy_signature)
-                    }
-                    
-            else:
-                # Токен больше не отслеживается
-                print(f"❌ Токен {token_address[:8]}... больше не отслеживается")
-                return None
-                
-            await asyncio.sleep(0.1)
+        await self._wait_event(token_address, 'buy', timeout, wallet)
+        
+        position = self.get_position(token_address, wallet)
+        if position is None:
+            # Токен больше не отслеживается
+            print(f"❌ Токен {token_address[:8]}... больше не отслеживается")
+            return None
+            
+        # Проверяем, найдена ли покупка
+        if position.is_bought:
+            print(f"✅ Покупка найдена для токена {token_address[:8]}... | Сигнатура: {position.buy_signature[:8]}... | Количество: {position.remaining_position:.6f}")
+            
+            # Возвращаем детали покупки
+            return {
+                'signature': position.buy_signature,
+                'token_address': token_address,
+                'token_amount': position.remaining_position,
+                'buy_info': position.buy_info(),
+                'timestamp': self.get_signature_time(position.buy_signature)
+            }
         
         print(f"⏰ Таймаут ожидания покупки для токена {token_address[:8]}...")
         return None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк разбора getTransaction (utils/tx_decoder.decode_swap).
+
+Каждый файл benchmarks/payloads/*.json: {"wallet", "signature", "result", "expected"}.
+result - ответ getTransaction (jsonParsed), expected - ожидаемый tx_info.
+Сначала сверяем результат с expected, затем меряем время разбора.
+
+    python benchmarks/bench_decoder.py [-n 20000]
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.tx_decoder import decode_swap
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+
+def _check(name: str, payload: dict) -> bool:
+    swap = decode_swap(payload["result"], payload["signature"], payload["wallet"])
+    got = swap.to_dict() if swap else None
+    expected = payload.get("expected")
+    if expected is None:
+        return True
+    if got is None or set(got) != set(expected):
+        print(f"❌ {name}: ожидали {expected}, получили {got}")
+        return False
+    for field, value in expected.items():
+        if isinstance(value, float):
+            if got[field] is None or not math.isclose(got[field], value, rel_tol=1e-9, abs_tol=1e-9):
+                print(f"❌ {name}: {field} = {got[field]}, ожидали {value}")
+                return False
+        elif got[field] != value:
+            print(f"❌ {name}: {field} = {got[field]}, ожидали {value}")
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=20000, help="разборов на один payload")
+    parser.add_argument("--payloads", default=PAYLOAD_DIR, help="каталог с payload-файлами")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.payloads, "*.json")))
+    if not files:
+        print(f"❌ Нет payload-файлов в {args.payloads}")
+        return 1
+
+    ok = True
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        ok = _check(name, payload) and ok
+
+        result, signature, wallet = payload["result"], payload["signature"], payload["wallet"]
+        runs = timeit.repeat(lambda: decode_swap(result, signature, wallet), number=args.number, repeat=5)
+        best_us = min(runs) / args.number * 1e6
+        print(f"{name:<24} {best_us:8.2f} мкс/разбор  ({args.number} x 5, лучший прогон)")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк реакции бота: пост в канале -> сигнатура -> разобранная покупка.
+
+Без Telegram, RPC и денег: main.handler получает подставное событие Telethon,
+«Wizard» (подставной клиент) через swap-ms после сообщения «проводит» покупку
+в локальной сети из benchmarks/mock_chain.py, через hold-ms - продажу.
+WebSocket отдаёт logsNotification, JSON-RPC - записанные getTransaction
+(benchmarks/payloads) и getTokenSupply с задержкой rpc-ms, цена SOL и пулы
+(фикстура DexScreener) - оттуда же.
+
+Печатает распределения call->signature (пост -> фрейм с сигнатурой покупки),
+signature->decoded (фрейм -> разобранная покупка), отчёт tracer по этапам
+и пропускную способность при N одновременных сделках.
+С --max-p95-ms код выхода 1, если p95 call->decoded выше порога.
+
+    python benchmarks/bench_e2e.py --trades 100 --concurrency 20 --rpc-ms 5
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_chain import MockChain, PayloadTemplate, percentiles, random_pump_mint, random_signature
+
+
+def _dummy_session() -> str:
+    """StringSession без авторизации - клиент создаётся, но никуда не подключается"""
+    from telethon.crypto import AuthKey
+    from telethon.sessions import StringSession
+    session = StringSession()
+    session.set_dc(2, "127.0.0.1", 443)
+    session.auth_key = AuthKey(bytes(256))
+    return base64.b64encode(session.save().encode()).decode()
+
+
+class FakeChat:
+    def __init__(self, username: str):
+        self.username = username
+
+
+class FakeEvent:
+    """То, что main.handler читает из events.NewMessage"""
+
+    def __init__(self, text: str, channel: str = "bench_channel"):
+        self.raw_text = text
+        self.date = datetime.now(timezone.utc)
+        self.chat = FakeChat(channel)
+        self.chat_id = -1001
+
+
+class FakeWizardClient:
+    """Вместо Telethon: сообщение в Wizard запускает покупку, затем продажу в подставной сети"""
+
+    def __init__(self, chain: MockChain, args, rnd: random.Random):
+        self.chain = chain
+        self.args = args
+        self.rnd = rnd
+        self.buy = PayloadTemplate("buy_pumpfun")
+        self.sell = PayloadTemplate("sell_temp_wsol")
+        self.buy_signatures = {}  # contract -> сигнатура покупки
+        self.tasks = set()
+
+    async def get_input_entity(self, peer):
+        return peer
+
+    async def send_message(self, chat_id, contract: str):
+        task = asyncio.create_task(self._swap(contract))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _swap(self, contract: str):
+        await asyncio.sleep(self.args.swap_ms / 1000)
+        buy_signature = random_signature(self.rnd)
+        self.buy_signatures[contract] = buy_signature
+        await self.chain.emit(self.buy.wallet, buy_signature, self.buy.render(contract, buy_signature))
+
+        await asyncio.sleep(self.args.hold_ms / 1000)
+        sell_signature = random_signature(self.rnd)
+        await self.chain.emit(self.sell.wallet, sell_signature, self.sell.render(contract, sell_signature))
+
+
+async def run(args) -> int:
+    chain = MockChain(rpc_ms=args.rpc_ms)
+    await chain.start()
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+
+    # config.py читает окружение при импорте - всё направляем в подставную сеть
+    for name, value in (("API_ID", "1"), ("API_HASH", "bench"), ("CHANNELS", "@bench_channel")):
+        os.environ.setdefault(name, value)
+    os.environ.update({
+        "WALLET_ADDRESS": PayloadTemplate("buy_pumpfun").wallet,
+        "WEBSOCKET_URL": chain.ws_url,
+        "RPC_URL": chain.rpc_url,
+        "SOL_PRICE_WS_URL": chain.ws_url,
+        "SOL_PRICE_REST_URL": chain.price_url,
+        "DEXSCREENER_URL": chain.dexscreener_url,
+        "TRADES_DB_PATH": os.path.join(workdir, "trades.db"),
+        "TRADES_JSON_PATH": os.path.join(workdir, "trades.json"),
+        "SESSION_BASE64": _dummy_session(),
+    })
+    for name in ("RPC_URLS", "WALLET_ADDRESSES", "WEBSOCKET_STANDBY_URL", "MAX_MCAP"):
+        os.environ.pop(name, None)
+    if args.decoy_wallets:
+        # Основной кошелёк - пустышка, покупки идут на последний: проверка маршрутизации по кошелькам
+        decoys = [random_pump_mint(random.Random(i)) for i in range(args.decoy_wallets)]
+        os.environ["WALLET_ADDRESSES"] = ",".join(decoys + [PayloadTemplate("buy_pumpfun").wallet])
+    if args.max_mcap:
+        # Включает проверку капы по bonding curve перед отправкой в Wizard
+        os.environ["MAX_MCAP"] = str(args.max_mcap)
+
+    import main
+    from TokenMonitor import token_monitor
+    from utils.transport import transport
+    from utils.price_feed import sol_price_feed
+    from utils.tracing import tracer
+
+    rnd = random.Random(args.seed)
+    wizard = FakeWizardClient(chain, args, rnd)
+    main.client = wizard
+
+    decoded_at = {}
+
+    async def on_buy(signature, token_address):
+        decoded_at[signature] = time.time()
+    token_monitor.on_buy_detected = on_buy
+
+    log = io.StringIO()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(log)
+    call_times = {}
+    with output:
+        await transport.start()
+        await sol_price_feed.start()
+        await token_monitor.start_monitoring()
+        # Как в main(): первый колл приходит на прогретого бота
+        await main.warm_up()
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one_trade(i: int):
+            contract = random_pump_mint(rnd)
+            async with semaphore:
+                call_times[contract] = time.time()
+                await main.handler(FakeEvent(f"🚀 New call $BENCH{i}\n\n{contract}\n\nMC: 50K"))
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(one_trade(i) for i in range(args.trades)))
+        finally:
+            elapsed = time.perf_counter() - started
+            await token_monitor.stop_monitoring()
+            await sol_price_feed.stop()
+            await transport.close()
+            await chain.stop()
+
+    call_to_signature, signature_to_decoded, call_to_decoded = [], [], []
+    for contract, call_time in call_times.items():
+        signature = wizard.buy_signatures.get(contract)
+        seen = token_monitor.get_signature_time(signature) if signature else None
+        decoded = decoded_at.get(signature)
+        if seen is None or decoded is None:
+            continue
+        call_to_signature.append((seen - call_time) * 1000)
+        signature_to_decoded.append((decoded - seen) * 1000)
+        call_to_decoded.append((decoded - call_time) * 1000)
+
+    print(f"сделок: {len(call_to_decoded)}/{args.trades} | одновременно: {args.concurrency} | "
+          f"rpc {args.rpc_ms:.0f} мс | своп через {args.swap_ms:.0f} мс")
+    print(f"call->signature      {percentiles(call_to_signature)}")
+    print(f"signature->decoded   {percentiles(signature_to_decoded)}")
+    print(f"call->decoded        {percentiles(call_to_decoded)}")
+    print(f"пропускная способность: {args.trades / elapsed:.1f} сделок/с ({elapsed:.2f} с), "
+          f"RPC-запросов: {chain.rpc_requests}, DexScreener: {chain.dexscreener_requests}")
+    tracer.dump()
+
+    if len(call_to_decoded) < args.trades:
+        print("❌ Не все покупки дошли до разбора")
+        return 1
+    if args.max_p95_ms:
+        p95 = sorted(call_to_decoded)[min(len(call_to_decoded) - 1, int(len(call_to_decoded) * 0.95))]
+        if p95 > args.max_p95_ms:
+            print(f"❌ p95 call->decoded {p95:.1f} мс выше порога {args.max_p95_ms:.1f} мс")
+            return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--trades", type=int, default=50, help="число сделок")
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="сделок одновременно")
+    parser.add_argument("--rpc-ms", type=float, default=5.0, help="задержка ответа JSON-RPC, мс")
+    parser.add_argument("--swap-ms", type=float, default=50.0, help="от сообщения в Wizard до покупки в сети, мс")
+    parser.add_argument("--hold-ms", type=float, default=100.0, help="от покупки до продажи, мс")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="порог p95 call->decoded для кода выхода")
+    parser.add_argument("--max-mcap", type=float, default=None,
+                        help="MAX_MCAP: с ним на каждом колле работает проверка капы (капа кривой в сети ~4.2K)")
+    parser.add_argument("--decoy-wallets", type=int, default=0,
+                        help="сколько кошельков без сделок отслеживать перед кошельком покупок")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-v", "--verbose", action="store_true", help="не глушить вывод бота")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Хеджирование RPC на локальных подставных узлах.
+
+Поднимает несколько aiohttp-серверов с заданной задержкой (и редкими
+«зависаниями»), гоняет через Transport запросы и печатает итоговые
+задержки и статистику по узлам.
+
+    python benchmarks/bench_hedging.py --delays 20,80,300 --stall 0.05 -n 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# config.py требует эти переменные - для локального стенда подойдут заглушки
+for name, value in (("API_ID", "1"), ("API_HASH", "bench"), ("CHANNELS", "bench"),
+                    ("WALLET_ADDRESS", "bench"), ("WEBSOCKET_URL", "ws://127.0.0.1:1"),
+                    ("RPC_URL", "http://127.0.0.1:1")):
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiohttp import web
+from utils.transport import Transport
+
+
+async def start_node(delay_ms: float, stall_rate: float, stall_ms: float) -> web.AppRunner:
+    """Подставной JSON-RPC узел: отвечает на любой метод после delay_ms (иногда после stall_ms)"""
+    async def handle(request: web.Request) -> web.Response:
+        payload = await request.json()
+        wait = stall_ms if random.random() < stall_rate else delay_ms * random.uniform(0.8, 1.2)
+        await asyncio.sleep(wait / 1000)
+        if isinstance(payload, list):
+            body = [{"jsonrpc": "2.0", "id": p.get("id"), "result": {"slot": 1}} for p in payload]
+        else:
+            body = {"jsonrpc": "2.0", "id": payload.get("id"), "result": {"slot": 1}}
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    return runner
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args):
+    delays = [float(d) for d in args.delays.split(",")]
+    runners, urls = [], []
+    for delay in delays:
+        runner = await start_node(delay, args.stall, args.stall_ms)
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        runners.append(runner)
+        urls.append(f"http://127.0.0.1:{port}/")
+
+    transport = Transport(rpc_urls=urls)
+    if args.no_hedge:
+        transport.hedge_min = 3600.0
+    latencies = []
+    try:
+        await transport.start()
+        for _ in range(args.number):
+            start = time.monotonic()
+            await transport.rpc_call("getSlot", [])
+            latencies.append((time.monotonic() - start) * 1000)
+    finally:
+        await transport.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    print(f"запросов: {len(latencies)} | дублей: {transport.hedges}")
+    print(f"p50 {_pct(latencies, 50):.1f} мс | p95 {_pct(latencies, 95):.1f} мс | p99 {_pct(latencies, 99):.1f} мс")
+    for report in transport.endpoint_report():
+        print(f"  {report['url']:<28} запросов {report['requests']:>5} | выигрышей {report['wins']:>5} | "
+              f"ewma {report['ewma_ms'] or 0:7.1f} мс | ошибок {report['failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delays", default="20,60,200", help="задержки узлов в мс через запятую")
+    parser.add_argument("--stall", type=float, default=0.05, help="доля запросов, на которых узел «зависает»")
+    parser.add_argument("--stall-ms", type=float, default=1500, help="задержка при зависании, мс")
+    parser.add_argument("-n", "--number", type=int, default=300, help="число запросов")
+    parser.add_argument("--no-hedge", action="store_true", help="без дублей (для сравнения)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска контракта в посте канала (TGparser.find_solana_contract).
+
+Корпус - JSONL, по строке на сообщение: {"text", "expected"}.
+expected - ожидаемый результат find_solana_contract (или null).
+Сначала сверяем результаты с expected, затем меряем время разбора
+всего корпуса новым сканером и прежней реализацией на трёх регэкспах.
+Свой корпус (выгрузка из каналов) - через --corpus.
+
+    python benchmarks/bench_parser.py [-n 2000] [--corpus messages.jsonl]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TGparser import find_solana_contract
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "messages.jsonl")
+
+
+def legacy_find_solana_contract(message: str):
+    """Прежняя реализация (три регэкспа, без проверки длины в байтах) - для сравнения"""
+    strict_match = re.search(r'^\s*([1-9A-HJ-NP-Za-km-z]{32,44})\s*$', message, re.MULTILINE)
+    if strict_match:
+        return {"contract": strict_match.group(1).strip(), "ticker": None, "mcap": None}
+
+    pump_match = re.search(r'([1-9A-HJ-NP-Za-km-z]{32,44}pump)', message)
+    if pump_match:
+        return {"contract": pump_match.group(1), "ticker": None, "mcap": None}
+
+    general_match = re.search(r'([1-9A-HJ-NP-Za-km-z]{32,44})', message)
+    if general_match:
+        full = general_match.group(0)
+        start, end = general_match.start(), general_match.end()
+        if (start == 0 or not message[start-1].isalnum()) and \
+           (end == len(message) or not message[end].isalnum()):
+            return {"contract": full, "ticker": None, "mcap": None}
+    return None
+
+
+def _same(got, expected) -> bool:
+    if got is None or expected is None:
+        return got is expected
+    if got["contract"] != expected["contract"] or got["ticker"] != expected["ticker"]:
+        return False
+    if got["mcap"] is None or expected["mcap"] is None:
+        return got["mcap"] is expected["mcap"]
+    return math.isclose(got["mcap"], expected["mcap"], rel_tol=1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="прогонов корпуса")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="JSONL-файл с сообщениями")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    texts = [entry["text"] for entry in corpus]
+
+    ok = True
+    legacy_misses = 0
+    for i, entry in enumerate(corpus):
+        if "expected" not in entry:
+            continue
+        got = find_solana_contract(entry["text"])
+        if not _same(got, entry["expected"]):
+            print(f"❌ #{i}: ожидали {entry['expected']}, получили {got}")
+            ok = False
+        legacy = legacy_find_solana_contract(entry["text"])
+        expected_contract = entry["expected"]["contract"] if entry["expected"] else None
+        if (legacy["contract"] if legacy else None) != expected_contract:
+            legacy_misses += 1
+    print(f"сообщений: {len(corpus)} | прежний парсер ошибся в выборе адреса: {legacy_misses}")
+
+    for name, func in (("сканер", find_solana_contract), ("прежний", legacy_find_solana_contract)):
+        runs = timeit.repeat(lambda: [func(text) for text in texts], number=args.number, repeat=5)
+        per_message_us = min(runs) / args.number / len(texts) * 1e6
+        print(f"{name:<10} {per_message_us:8.2f} мкс/сообщение  ({args.number} x 5, лучший прогон)")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Локальная подставная «сеть» для бенчмарков: WebSocket с logsNotification
+и JSON-RPC с записанными ответами getTransaction / getTokenSupply
+и аккаунтами bonding curve / mint для getMultipleAccounts,
+плюс фикстура DexScreener /tokens/v1/solana/... (DEXSCREENER_URL = dexscreener_url).
+
+Транзакции берутся из benchmarks/payloads/*.json: минт и сигнатура
+шаблона подменяются на нужные, так что одна запись покупки/продажи
+обслуживает сколько угодно сделок.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+from typing import Dict, List, Optional
+
+import websockets
+from aiohttp import web
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+PUMP_PROGRAM = "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P"
+
+
+def b58encode(data: bytes) -> str:
+    value = int.from_bytes(data, "big")
+    digits = ""
+    while value:
+        value, rest = divmod(value, 58)
+        digits = B58_ALPHABET[rest] + digits
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + digits
+
+
+def random_signature(rnd: random.Random) -> str:
+    return b58encode(rnd.getrandbits(512).to_bytes(64, "big"))
+
+
+def random_pump_mint(rnd: random.Random) -> str:
+    """32-байтный адрес с суффиксом pump, как у минтов pump.fun"""
+    suffix = 0
+    for char in "pump":
+        suffix = suffix * 58 + B58_ALPHABET.index(char)
+    while True:
+        value = (rnd.getrandbits(256) // 58 ** 4) * 58 ** 4 + suffix
+        if 2 ** 248 <= value < 2 ** 256:
+            return b58encode(value.to_bytes(32, "big"))
+
+
+class PayloadTemplate:
+    """Записанный getTransaction, в котором можно подменить минт и сигнатуру"""
+
+    def __init__(self, name: str):
+        with open(os.path.join(PAYLOAD_DIR, f"{name}.json"), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        self.wallet = payload["wallet"]
+        self.expected = payload["expected"]
+        self._text = json.dumps(payload["result"])
+        self._mint = payload["expected"]["token_address"]
+        self._signature = payload["signature"]
+
+    def render(self, mint: str, signature: str) -> dict:
+        return json.loads(self._text.replace(self._mint, mint).replace(self._signature, signature))
+
+
+class MockChain:
+    """
+    WebSocket + JSON-RPC на 127.0.0.1 со случайными портами.
+    rpc_ms - задержка ответа RPC, на каждый запрос (batch - один запрос).
+    Каждому подключению WebSocket сразу шлётся цена SOL ({"p": ...}),
+    так что тот же адрес подходит и для стрима цены.
+    """
+
+    def __init__(self, rpc_ms: float = 0.0, sol_price: float = 150.0,
+                 supply: int = 1_000_000_000, decimals: int = 6, curve_sol: float = 30.0):
+        self.rpc_ms = rpc_ms
+        self.sol_price = sol_price
+        self.supply = supply
+        self.decimals = decimals
+        # Резервы bonding curve как у свежего токена pump.fun; капа ~ curve_sol / 1.073 * цена SOL
+        self.virtual_sol = int(curve_sol * 10 ** 9)
+        self.virtual_token = 1_073_000_000 * 10 ** decimals
+
+        self.transactions: Dict[str, dict] = {}      # signature -> result getTransaction
+        self.subscribers: Dict[object, Dict[str, int]] = {}  # соединение -> кошелёк -> id подписки
+        self._next_subscription = 1
+        self._runner: Optional[web.AppRunner] = None
+        self._ws_server = None
+        self.rpc_url = ""
+        self.ws_url = ""
+        self.price_url = ""
+        self.dexscreener_url = ""
+        self.rpc_requests = 0
+        self.dexscreener_requests = 0
+
+    # ---------- запуск ----------
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/", self._handle_rpc)
+        app.router.add_get("/price", self._handle_price)
+        app.router.add_get("/tokens/v1/{chain}/{addresses}", self._handle_dexscreener)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        http_port = site._server.sockets[0].getsockname()[1]
+        self.rpc_url = f"http://127.0.0.1:{http_port}/"
+        self.price_url = f"http://127.0.0.1:{http_port}/price"
+        self.dexscreener_url = f"http://127.0.0.1:{http_port}"
+
+        self._ws_server = await websockets.serve(self._handle_ws, "127.0.0.1", 0)
+        ws_port = list(self._ws_server.sockets)[0].getsockname()[1]
+        self.ws_url = f"ws://127.0.0.1:{ws_port}"
+
+    async def stop(self):
+        if self._ws_server is not None:
+            self._ws_server.close()
+            await self._ws_server.wait_closed()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # ---------- WebSocket ----------
+
+    async def _handle_ws(self, ws, *args):
+        subscriptions: Dict[str, int] = {}
+        self.subscribers[ws] = subscriptions
+        try:
+            await ws.send(json.dumps({"p": str(self.sol_price)}))
+            async for msg in ws:
+                data = json.loads(msg)
+                if data.get("method") != "logsSubscribe":
+                    continue
+                wallet = data["params"][0]["mentions"][0]
+                subscription = self._next_subscription
+                self._next_subscription += 1
+                subscriptions[wallet] = subscription
+                await ws.send(json.dumps({"jsonrpc": "2.0", "id": data["id"], "result": subscription}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.subscribers.pop(ws, None)
+
+    async def emit(self, wallet: str, signature: str, result: dict):
+        """Кладёт транзакцию в «сеть» и рассылает logsNotification подписчикам кошелька"""
+        self.transactions[signature] = result
+        for ws, subscriptions in list(self.subscribers.items()):
+            subscription = subscriptions.get(wallet)
+            if subscription is None:
+                continue
+            frame = {
+                "jsonrpc": "2.0",
+                "method": "logsNotification",
+                "params": {
+                    "subscription": subscription,
+                    "result": {
+                        "context": {"slot": result.get("slot", 1)},
+                        "value": {
+                            "signature": signature,
+                            "err": None,
+                            "logs": [f"Program {PUMP_PROGRAM} invoke [1]", f"Program {PUMP_PROGRAM} success"]
+                        }
+                    }
+                }
+            }
+            try:
+                await ws.send(json.dumps(frame))
+            except websockets.ConnectionClosed:
+                pass
+
+    # ---------- JSON-RPC ----------
+
+    def _account(self, key: str) -> dict:
+        """Минты бенчмарка оканчиваются на pump, всё остальное считаем bonding curve"""
+        if key.endswith("pump"):
+            # SPL mint: mint_authority (нет), supply, decimals, is_initialized, freeze_authority (нет)
+            data = struct.pack("<I32sQB?I32s", 0, bytes(32), self.supply * 10 ** self.decimals,
+                               self.decimals, True, 0, bytes(32))
+            owner = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+        else:
+            data = struct.pack("<8sQQQQQ?", bytes(8), self.virtual_token, self.virtual_sol,
+                               self.virtual_token - 279_900_000 * 10 ** self.decimals, 0,
+                               self.supply * 10 ** self.decimals, False)
+            owner = PUMP_PROGRAM
+        return {"data": [base64.b64encode(data).decode(), "base64"], "executable": False,
+                "lamports": 1_461_600, "owner": owner, "rentEpoch": 0, "space": len(data)}
+
+    def _answer(self, request: dict) -> dict:
+        method = request.get("method")
+        params = request.get("params") or []
+        if method == "getTransaction":
+            result = self.transactions.get(params[0])
+        elif method == "getSignatureStatuses":
+            result = {"context": {"slot": 1}, "value": [
+                {"slot": 1, "confirmations": None, "err": None, "confirmationStatus": "confirmed"}
+                if signature in self.transactions else None
+                for signature in params[0]
+            ]}
+        elif method == "getTokenSupply":
+            result = {"context": {"slot": 1}, "value": {
+                "amount": str(self.supply * 10 ** self.decimals),
+                "decimals": self.decimals,
+                "uiAmountString": str(self.supply)
+            }}
+        elif method == "getMultipleAccounts":
+            result = {"context": {"slot": 1}, "value": [self._account(key) for key in params[0]]}
+        elif method == "getSignaturesForAddress":
+            result = []
+        elif method == "getHealth":
+            result = "ok"
+        else:
+            return {"jsonrpc": "2.0", "id": request.get("id"),
+                    "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    async def _handle_rpc(self, request: web.Request) -> web.Response:
+        self.rpc_requests += 1
+        payload = await request.json()
+        if self.rpc_ms:
+            await asyncio.sleep(self.rpc_ms / 1000)
+        if isinstance(payload, list):
+            body: object = [self._answer(item) for item in payload]
+        else:
+            body = self._answer(payload)
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    async def _handle_price(self, request: web.Request) -> web.Response:
+        return web.Response(text=json.dumps({"symbol": "SOLUSDT", "price": str(self.sol_price)}),
+                            content_type="application/json")
+
+    # ---------- DexScreener ----------
+
+    def curve_mcap(self) -> float:
+        """Капа по резервам кривой - та же, что посчитает utils/mcap.py"""
+        price_sol = (self.virtual_sol / 10 ** 9) / (self.virtual_token / 10 ** self.decimals)
+        return price_sol * self.sol_price * self.supply
+
+    def _pair(self, mint: str) -> dict:
+        mcap = self.curve_mcap()
+        return {
+            "chainId": "solana",
+            "dexId": "pumpfun",
+            "pairAddress": b58encode(hashlib.sha256(mint.encode()).digest()),
+            "baseToken": {"address": mint, "name": "Bench", "symbol": "BENCH"},
+            "quoteToken": {"address": "So11111111111111111111111111111111111111112", "name": "Wrapped SOL", "symbol": "SOL"},
+            "priceUsd": f"{mcap / self.supply:.12f}",
+            "liquidity": {"usd": self.virtual_sol / 10 ** 9 * self.sol_price * 2},
+            "fdv": mcap,
+            "marketCap": mcap,
+        }
+
+    async def _handle_dexscreener(self, request: web.Request) -> web.Response:
+        """Как /tokens/v1/{chain}/{addresses}: не больше 30 адресов, пары только у минтов на pump"""
+        self.dexscreener_requests += 1
+        addresses = request.match_info["addresses"].split(",")
+        if len(addresses) > 30:
+            return web.Response(status=400, text="too many addresses")
+        if self.rpc_ms:
+            await asyncio.sleep(self.rpc_ms / 1000)
+        pairs = [self._pair(mint) for mint in addresses
+                 if request.match_info["chain"] == "solana" and mint.endswith("pump")]
+        return web.Response(text=json.dumps(pairs), content_type="application/json")
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "нет данных"
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return f"p50 {pick(50):8.1f} мс | p95 {pick(95):8.1f} мс | p99 {pick(99):8.1f} мс | max {ordered[-1]:8.1f} мс"
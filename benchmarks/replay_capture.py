@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записи трафика (CAPTURE_PATH, utils/capture.py) через TokenMonitor.
+
+Фреймы logsNotification подаются в _process_transaction в исходном темпе
+(--speed 1), ускоренно (--speed 10) или без пауз (--speed 0). getTransaction
+и getTokenSupply отвечают записанными результатами, сеть не нужна.
+Файл читается через mmap: в памяти только индекс смещений, не сами ответы.
+
+По умолчанию токены всех записанных покупок ставятся на отслеживание
+заранее - так проходит весь цикл позиции (покупка -> продажи -> закрытие).
+
+    CAPTURE_PATH=capture.bin python main.py          # запись
+    python benchmarks/replay_capture.py capture.bin --speed 0
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+# config.py требует эти переменные - для воспроизведения подойдут заглушки
+for name, value in (("API_ID", "1"), ("API_HASH", "replay"), ("CHANNELS", "replay"),
+                    ("WALLET_ADDRESS", "replay"), ("WEBSOCKET_URL", "ws://127.0.0.1:1"),
+                    ("RPC_URL", "http://127.0.0.1:1")):
+    os.environ.setdefault(name, value)
+# Воспроизведение не пишет ни новую запись, ни настоящий журнал сделок
+os.environ.pop("CAPTURE_PATH", None)
+_workdir = tempfile.mkdtemp(prefix="replay_")
+os.environ["TRADES_DB_PATH"] = os.path.join(_workdir, "trades.db")
+os.environ["TRADES_JSON_PATH"] = os.path.join(_workdir, "trades.json")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.capture import CaptureReader, KIND_FRAME, KIND_TRANSACTION, KIND_TOKEN_SUPPLY
+from utils.tx_decoder import decode_swap
+from utils.transport import transport
+from utils.tx_fetcher import tx_fetcher
+from utils.price_feed import sol_price_feed
+from utils.tracing import tracer
+from trading.position import PositionState
+from TokenMonitor import token_monitor
+
+
+def build_index(reader: CaptureReader):
+    """Один проход по файлу: смещения фреймов, ответов getTransaction и getTokenSupply"""
+    frames = []        # (ts, offset) в порядке записи
+    transactions = {}  # signature -> offset
+    supplies = {}      # mint -> offset
+    for offset, ts, kind, key in reader.headers():
+        if kind == KIND_FRAME:
+            frames.append((ts, offset))
+        elif kind == KIND_TRANSACTION:
+            transactions[key] = offset
+        elif kind == KIND_TOKEN_SUPPLY:
+            supplies[key] = offset
+    return frames, transactions, supplies
+
+
+def frame_signature(reader: CaptureReader, offset: int):
+    """(кошелёк, сигнатура) фрейма или None для фреймов с ошибкой транзакции"""
+    record = reader.read_at(offset)
+    value = record.json().get("params", {}).get("result", {}).get("value", {})
+    if not value.get("signature") or value.get("err"):
+        return None
+    return record.key, value["signature"]
+
+
+async def run(args) -> int:
+    reader = CaptureReader(args.capture)
+    started = time.perf_counter()
+    frames, transactions, supplies = build_index(reader)
+    print(f"📂 {args.capture}: фреймов {len(frames)}, getTransaction {len(transactions)}, "
+          f"getTokenSupply {len(supplies)} (индекс за {time.perf_counter() - started:.2f} с)")
+    if not frames:
+        return 1
+
+    # Записанные ответы вместо сети
+    async def replay_fetch(signature):
+        offset = transactions.get(signature)
+        return reader.read_at(offset).json() if offset is not None else None
+
+    async def replay_rpc_call(method, params, timeout=10):
+        if method == "getTokenSupply" and params and params[0] in supplies:
+            return reader.read_at(supplies[params[0]]).json()
+        return None
+
+    tx_fetcher.fetch = replay_fetch
+    transport.rpc_call = replay_rpc_call
+    sol_price_feed.max_age = float("inf")
+    sol_price_feed.set_price(args.sol_price)
+
+    if not args.no_track:
+        tracked = 0
+        for _, offset in frames:
+            item = frame_signature(reader, offset)
+            if item is None or item[1] not in transactions:
+                continue
+            wallet, signature = item
+            swap = decode_swap(reader.read_at(transactions[signature]).json(), signature, wallet)
+            if swap and swap.direction == "buy" and token_monitor.get_position(swap.token_address, wallet) is None:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    token_monitor.add_token(swap.token_address, wallet=wallet)
+                tracked += 1
+        print(f"📝 На отслеживание поставлено токенов: {tracked}")
+
+    log = io.StringIO()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(log)
+    lag_ms = []
+    tasks = []
+    first_ts = frames[0][0]
+    with output:
+        started = time.perf_counter()
+        for ts, offset in frames:
+            if args.speed > 0:
+                due = (ts - first_ts) / args.speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag_ms.append(-delay * 1000)
+            item = frame_signature(reader, offset)
+            if item is None:
+                continue
+            wallet, signature = item
+            if args.speed > 0:
+                tasks.append(asyncio.create_task(token_monitor._process_transaction(signature, wallet)))
+            else:
+                await token_monitor._process_transaction(signature, wallet)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    states = {}
+    for address, stats in token_monitor.get_wallet_stats().items():
+        for position in token_monitor.wallets[address].active_tokens.values():
+            states[position.state] = states.get(position.state, 0) + 1
+        print(f"👛 {address}: {json.dumps(stats, ensure_ascii=False)}")
+    print(f"📊 Позиции: открыты {states.get(PositionState.OPEN, 0)}, "
+          f"ждут покупку {states.get(PositionState.WAITING_BUY, 0)}, "
+          f"закрыты {states.get(PositionState.CLOSED, 0)}")
+    print(f"⏱️ {len(frames)} фреймов за {elapsed:.2f} с ({len(frames) / elapsed:.0f} фреймов/с, скорость x{args.speed:g})")
+    if lag_ms:
+        lag_ms.sort()
+        print(f"   отставание от расписания: p50 {lag_ms[len(lag_ms) // 2]:.1f} мс | max {lag_ms[-1]:.1f} мс")
+    tracer.dump()
+    reader.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="файл записи (CAPTURE_PATH)")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 - исходный темп, 10 - в 10 раз быстрее, 0 - без пауз")
+    parser.add_argument("--sol-price", type=float, default=150.0, help="цена SOL для расчёта капы продаж")
+    parser.add_argument("--no-track", action="store_true", help="не ставить токены покупок на отслеживание")
+    parser.add_argument("-v", "--verbose", action="store_true", help="не глушить вывод TokenMonitor")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
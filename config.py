@@ -6,23 +6,117 @@ import os
 import sys
 from pathlib import Path
 
+# ---------- Helpers ----------
+def _to_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
 # ---------- Telegram ----------
 api_id       = int(os.getenv("API_ID") or 0)
 api_hash     = os.getenv("API_HASH")
 session_name = os.getenv("SESSION_NAME", "trader_session")  # StringSession will reuse this name for logs
-channel_username = os.getenv("CHANNELS")   # can be ID (-100...) or @publichandle
+channel_username = os.getenv("CHANNELS")   # can be ID (-100...) or @publichandle, several comma-separated
+# Каналы-источники: числовые ID приводим к int, чтобы Telethon не искал их как username
+channel_usernames = [int(c) if c.lstrip("-").isdigit() else c
+                     for c in (c.strip() for c in (channel_username or "").split(",")) if c]
+channel_username  = channel_usernames[0] if channel_usernames else None
+# Один контракт из разных каналов в пределах окна - одна сделка, остальные посты пишем как доп. источники
+CALL_DEDUPE_WINDOW = _to_float(os.getenv("CALL_DEDUPE_WINDOW"), 3600.0)
 
 # ---------- Trading ----------
 APP               = os.getenv("TRADING_APP", "Wizard").strip()
 wizard_chat_id    = os.getenv("WIZARD_CHAT_ID", "@TradeWiz_Solbot")
 wallet_address    = os.getenv("WALLET_ADDRESS")
-max_mcap          = os.getenv("MAX_MCAP")           # optional, int or None
+# Несколько кошельков через запятую - один монитор на все; первый считается основным
+wallet_addresses  = [w.strip() for w in os.getenv("WALLET_ADDRESSES", "").split(",") if w.strip()] \
+                    or ([wallet_address] if wallet_address else [])
+wallet_address    = wallet_address or (wallet_addresses[0] if wallet_addresses else None)
+max_mcap          = _to_float(os.getenv("MAX_MCAP"), None)  # optional, USD or None
 WEBSOCKET_URL     = os.getenv("WEBSOCKET_URL")
+WEBSOCKET_STANDBY_URL = os.getenv("WEBSOCKET_STANDBY_URL")  # optional: вторая горячая подписка (можно тот же URL)
 RPC_URL           = os.getenv("RPC_URL")
+# Несколько RPC через запятую: запросы дублируются на следующий узел, если первый отвечает дольше обычного
+RPC_URLS          = [u.strip() for u in os.getenv("RPC_URLS", "").split(",") if u.strip()] or ([RPC_URL] if RPC_URL else [])
+
+# ---------- Monitoring ----------
+INGEST_WORKERS    = _to_int(os.getenv("INGEST_WORKERS"), 4)        # сколько воркеров разбирают очередь сигнатур
+INGEST_QUEUE_SIZE = _to_int(os.getenv("INGEST_QUEUE_SIZE"), 1000)  # при заполнении приём с WS ждёт (backpressure)
+SIGNATURE_TTL     = _to_float(os.getenv("SIGNATURE_TTL"), 3600.0)  # секунд помним сигнатуры (дедуп и время)
+WS_BACKFILL_LIMIT = _to_int(os.getenv("WS_BACKFILL_LIMIT"), 200)   # сколько сигнатур добираем после переподключения
+WS_RECONNECT_MAX  = _to_float(os.getenv("WS_RECONNECT_MAX"), 10.0) # потолок паузы между переподключениями, с
+CAPTURE_PATH      = os.getenv("CAPTURE_PATH")  # optional: писать фреймы и ответы RPC для воспроизведения (benchmarks/replay_capture.py)
+# Фильтр logsNotification по логам: off - всё подряд, deprioritize - не-свапы в конец очереди, skip - не-свапы пропускаем
+LOG_FILTER_MODE   = os.getenv("LOG_FILTER_MODE", "deprioritize").strip().lower()
+SWAP_PROGRAM_IDS  = [p.strip() for p in os.getenv("SWAP_PROGRAM_IDS", "").split(",") if p.strip()]  # пусто - список по умолчанию
+
+# ---------- HTTP transport ----------
+HTTP_POOL_LIMIT    = _to_int(os.getenv("HTTP_POOL_LIMIT"), 100)    # всего соединений в пуле
+HTTP_POOL_PER_HOST = _to_int(os.getenv("HTTP_POOL_PER_HOST"), 20)  # соединений на один хост
+HTTP_KEEPALIVE     = _to_int(os.getenv("HTTP_KEEPALIVE"), 60)      # секунд держим простаивающее соединение
+RPC_HEDGE_PERCENTILE = _to_float(os.getenv("RPC_HEDGE_PERCENTILE"), 90.0)  # дубль запроса после этого перцентиля задержки узла
+RPC_HEDGE_MIN_MS     = _to_int(os.getenv("RPC_HEDGE_MIN_MS"), 30)          # но не раньше, чем через столько мс
+RPC_PROBE_EVERY      = _to_int(os.getenv("RPC_PROBE_EVERY"), 50)           # каждый N-й запрос - первым на другой узел (перепроверка здоровья)
+WARMUP_CONNECTIONS   = _to_int(os.getenv("WARMUP_CONNECTIONS"), 2)         # соединений на RPC-узел открываем при старте
+WARMUP_TIMEOUT       = _to_float(os.getenv("WARMUP_TIMEOUT"), 10.0)        # сколько ждём прогрева при старте, с
+KEEP_WARM_INTERVAL   = _to_float(os.getenv("KEEP_WARM_INTERVAL"), HTTP_KEEPALIVE / 2)  # пинг узлов, чтобы пул не остывал; 0 - выкл
+
+# ---------- getTransaction batching ----------
+TX_BATCH_WINDOW_MS = _to_int(os.getenv("TX_BATCH_WINDOW_MS"), 20)  # окно сбора сигнатур в один batch
+TX_BATCH_MAX       = _to_int(os.getenv("TX_BATCH_MAX"), 20)        # максимум сигнатур в одном batch
+TX_RETRY_BASE_MS   = _to_int(os.getenv("TX_RETRY_BASE_MS"), 100)   # первая пауза перед повтором, дальше x2
+TX_RETRY_MAX_MS    = _to_int(os.getenv("TX_RETRY_MAX_MS"), 1000)   # потолок паузы между повторами
+TX_FETCH_TIMEOUT   = _to_float(os.getenv("TX_FETCH_TIMEOUT"), 15.0)  # секунд ждём транзакцию, затем сдаёмся
+
+# ---------- Trade stages (trading/stages.py) ----------
+STAGE_SEND_TIMEOUT   = _to_float(os.getenv("STAGE_SEND_TIMEOUT"), 10.0)    # отправка контракта в Wizard, с
+STAGE_FETCH_TIMEOUT  = _to_float(os.getenv("STAGE_FETCH_TIMEOUT"), 10.0)   # цена SOL и supply, с
+STAGE_POOL_TIMEOUT   = _to_float(os.getenv("STAGE_POOL_TIMEOUT"), 5.0)     # поиск пула, с
+BUY_SIGNATURE_TIMEOUT = _to_float(os.getenv("BUY_SIGNATURE_TIMEOUT"), 120.0)  # ждём покупку после колла, с
+BUY_DECODE_TIMEOUT    = _to_float(os.getenv("BUY_DECODE_TIMEOUT"), 30.0)      # ждём детали покупки после сигнатуры, с
+
+# ---------- Pre-trade mcap check (utils/mcap.py) ----------
+MCAP_CHECK_BUDGET_MS = _to_int(os.getenv("MCAP_CHECK_BUDGET_MS"), 50)  # сколько ждём оценку капы перед отправкой в Wizard
+# Ограничение: на бюджет рассчитана только bonding curve pump.fun (один getMultipleAccounts).
+# Токены не на кривой (мигрировавшие, bonk и т.п.) оцениваются через DexScreener (HTTP,
+# DEXSCREENER_RATE) - с холодным кэшем пулов в 50 мс это почти никогда не успевает, и для них
+# проверка фактически решается MCAP_CHECK_FAIL_MODE: open - покупаем без проверки, closed - всегда пропускаем.
+# Нужна проверка и для них - поднимайте бюджет до 300-500 мс ценой задержки отправки в Wizard
+# open - не уложились в бюджет или не смогли оценить -> покупаем; closed -> пропускаем колл
+MCAP_CHECK_FAIL_MODE = os.getenv("MCAP_CHECK_FAIL_MODE", "open").strip().lower()
+
+# ---------- Pool lookup (utils/PoolFinder.py) ----------
+DEXSCREENER_URL      = os.getenv("DEXSCREENER_URL", "https://api.dexscreener.com")  # можно направить на локальный фикстур-сервер
+DEXSCREENER_RATE     = _to_float(os.getenv("DEXSCREENER_RATE"), 4.0)    # запросов в секунду (лимит API - 300 в минуту); 0 - без ограничения
+POOL_BATCH_WINDOW_MS = _to_int(os.getenv("POOL_BATCH_WINDOW_MS"), 10)   # окно сбора минтов в один запрос
+POOL_CACHE_TTL       = _to_float(os.getenv("POOL_CACHE_TTL"), 60.0)     # секунд помним найденную пару (капа из неё стареет)
+POOL_NEGATIVE_TTL    = _to_float(os.getenv("POOL_NEGATIVE_TTL"), 15.0)  # секунд помним, что пула нет
+POOL_CACHE_SIZE      = _to_int(os.getenv("POOL_CACHE_SIZE"), 2048)      # минтов в кэше
+
+# ---------- SOL/USD price ----------
+SOL_PRICE_WS_URL   = os.getenv("SOL_PRICE_WS_URL", "wss://stream.binance.com:9443/ws/solusdt@aggTrade")
+SOL_PRICE_REST_URL = os.getenv("SOL_PRICE_REST_URL", "https://api.binance.com/api/v3/ticker/price?symbol=SOLUSDT")
+SOL_PRICE_MAX_AGE  = _to_float(os.getenv("SOL_PRICE_MAX_AGE"), 10.0)  # секунд, после которых цена считается устаревшей
+
+# ---------- Token supply cache ----------
+SUPPLY_CACHE_TTL  = _to_float(os.getenv("SUPPLY_CACHE_TTL"), 3600.0)  # секунд
+SUPPLY_CACHE_SIZE = _to_int(os.getenv("SUPPLY_CACHE_SIZE"), 1024)     # минтов в кэше
+
+# ---------- Trade journal ----------
+TRADES_DB_PATH   = os.getenv("TRADES_DB_PATH", "trades.db")      # SQLite (WAL) журнал сделок
+TRADES_JSON_PATH = os.getenv("TRADES_JSON_PATH", "trades.json")  # старый формат, импортируется при первом запуске
 
 # ---------- Constants (never changes) ----------
 SOL      = "So11111111111111111111111111111111111111112"
 USDC     = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+PUMP_PROGRAM = "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P"
 DECIMALS = 6
 
 # ---------- Validation ----------
@@ -33,19 +127,18 @@ def _require(var, name):
 
 _require(api_hash,     "API_HASH")
 _require(channel_username, "CHANNELS")
-_require(wallet_address,   "WALLET_ADDRESS")
+_require(wallet_address,   "WALLET_ADDRESS (or WALLET_ADDRESSES)")
 _require(WEBSOCKET_URL,    "WEBSOCKET_URL")
 _require(RPC_URL,          "RPC_URL")
 
+if LOG_FILTER_MODE not in ("off", "deprioritize", "skip"):
+    print(f"❌ LOG_FILTER_MODE must be off, deprioritize or skip (got {LOG_FILTER_MODE})")
+    sys.exit(1)
+
+if MCAP_CHECK_FAIL_MODE not in ("open", "closed"):
+    print(f"❌ MCAP_CHECK_FAIL_MODE must be open or closed (got {MCAP_CHECK_FAIL_MODE})")
+    sys.exit(1)
+
 if api_id <= 0:
     print("❌ API_ID must be a positive integer")
     sys.exit(1)
-
-# Optional numeric parsing
-if max_mcap:
-    try:
-        max_mcap = int(max_mcap)
-    except ValueError:
-        max_mcap = None
-else:
-    max_mcap = None
\ No newline at end of file
@@ -1 +1,394 @@
-# переделать под удобную таблицу с пнл
+import json
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    token_address   TEXT PRIMARY KEY,
+    ticker          TEXT,
+    call_cap        REAL,
+    entry_cap       REAL,
+    tokens          REAL,
+    buy_transaction TEXT,
+    total_pnl       REAL DEFAULT 0,
+    entry_time      TEXT,
+    exit_time       TEXT,
+    signature_time  REAL
+);
+CREATE TABLE IF NOT EXISTS sells (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_address    TEXT NOT NULL,
+    sell_transaction TEXT NOT NULL UNIQUE,
+    sell_cap         REAL,
+    sell_percent     REAL,
+    tokens_for_sale  REAL
+);
+CREATE TABLE IF NOT EXISTS call_sources (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_address TEXT NOT NULL,
+    channel       TEXT NOT NULL,
+    call_time     REAL,
+    UNIQUE (token_address, channel)
+);
+CREATE INDEX IF NOT EXISTS idx_trades_entry_time ON trades (entry_time);
+CREATE INDEX IF NOT EXISTS idx_trades_ticker ON trades (ticker COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_trades_pnl ON trades (total_pnl);
+CREATE INDEX IF NOT EXISTS idx_trades_open ON trades (token_address) WHERE exit_time IS NULL;
+CREATE INDEX IF NOT EXISTS idx_sells_token ON sells (token_address);
+CREATE INDEX IF NOT EXISTS idx_call_sources_token ON call_sources (token_address);
+"""
+
+# Время удержания позиции в секундах (только для закрытых сделок)
+HOLD_SECONDS_SQL = "(julianday(exit_time) - julianday(entry_time)) * 86400.0"
+
+INSERT_TRADE_SQL = (
+    "INSERT OR IGNORE INTO trades (token_address, ticker, call_cap, entry_cap, tokens, "
+    "buy_transaction, total_pnl, entry_time, exit_time, signature_time) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_SELL_SQL = (
+    "INSERT OR IGNORE INTO sells (token_address, sell_transaction, sell_cap, sell_percent, tokens_for_sale) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+INSERT_CALL_SOURCE_SQL = (
+    "INSERT OR IGNORE INTO call_sources (token_address, channel, call_time) VALUES (?, ?, ?)"
+)
+
+_STOP = object()
+
+ENTRY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Префиксы entry_time и длина периода, который они задают
+_PREFIX_PERIODS = (
+    ("%Y", "year"),
+    ("%Y-%m", "month"),
+    ("%Y-%m-%d", "days"),
+    ("%Y-%m-%d %H", "hours"),
+    ("%Y-%m-%d %H:%M", "minutes"),
+    (ENTRY_TIME_FORMAT, "seconds"),
+)
+
+
+def _trade_params(token_address: str, trade: dict) -> tuple:
+    return (token_address, trade.get("ticker"), trade.get("call_cap"), trade.get("entry_cap"),
+            trade.get("tokens"), trade.get("buy_transaction"), trade.get("total_pnl", 0.0),
+            trade.get("entry_time"), trade.get("exit_time"), trade.get("signature_time"))
+
+
+class TradeDatabase:
+    """
+    Журнал сделок в SQLite (WAL): одна маленькая запись на событие
+    (покупка, продажа, финализация) вместо перезаписи всего файла.
+    Запись идёт в фоновом потоке: события собираются в пачку
+    и коммитятся одной транзакцией (один fsync на пачку).
+    """
+
+    def __init__(self, path: str = "trades.db", batch_size: int = 64, flush_interval: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._reader: Optional[sqlite3.Connection] = None
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="trade-db-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    # ---------- запись (не блокирует event loop) ----------
+
+    def _submit(self, sql: str, params: tuple):
+        self._queue.put((sql, params))
+
+    def insert_trade(self, token_address: str, trade: dict):
+        self._submit(INSERT_TRADE_SQL, _trade_params(token_address, trade))
+
+    def insert_sell(self, token_address: str, sell_transaction: str, sell_cap: float,
+                    sell_percent: float, tokens_for_sale: Optional[float]):
+        self._submit(INSERT_SELL_SQL, (token_address, sell_transaction, sell_cap, sell_percent, tokens_for_sale))
+
+    def insert_call_source(self, token_address: str, channel: str, call_time: Optional[float]):
+        self._submit(INSERT_CALL_SOURCE_SQL, (token_address, channel, call_time))
+
+    def finalize_trade(self, token_address: str, total_pnl: float, exit_time: str):
+        self._submit(
+            "UPDATE trades SET total_pnl = ?, exit_time = ? WHERE token_address = ?",
+            (total_pnl, exit_time, token_address)
+        )
+
+    def _writer_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    break
+
+            stop = False
+            flushed = []
+            try:
+                with conn:
+                    for item in batch:
+                        if item is _STOP:
+                            stop = True
+                        elif isinstance(item, threading.Event):
+                            flushed.append(item)
+                        else:
+                            conn.execute(*item)
+            except sqlite3.Error as e:
+                print(f"❌ Ошибка записи журнала сделок: {e}")
+
+            for event in flushed:
+                event.set()
+            if stop:
+                conn.close()
+                return
+
+    def flush(self, timeout: float = 5.0):
+        """Ждёт, пока все поставленные события будут записаны на диск"""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(5.0)
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    # ---------- чтение ----------
+
+    def is_empty(self) -> bool:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM trades LIMIT 1").fetchone() is None
+        finally:
+            conn.close()
+
+    def load_all(self) -> Dict[str, dict]:
+        """Вся история в прежнем формате trades.json - только для экспорта"""
+        return self.load_trades()
+
+    def load_open(self) -> Dict[str, dict]:
+        """Незакрытые сделки - всё, что логгеру нужно держать в памяти"""
+        return self.load_trades(open_only=True)
+
+    def load_mints(self) -> set:
+        """Минты всех сделок журнала (по первичному ключу, без чтения строк)"""
+        return {row[0] for row in self._read_conn().execute("SELECT token_address FROM trades")}
+
+    def load_trades(self, open_only: bool = False, **filters) -> Dict[str, dict]:
+        """
+        Сделки в формате trades.json по фильтрам query_trades; open_only - только незакрытые.
+        Продажи и источники читаются только для выбранных сделок.
+        """
+        where, params = self._build_filter(**filters)
+        if open_only:
+            where += (" AND " if where else " WHERE ") + "exit_time IS NULL"
+        selected = f"SELECT token_address FROM trades{where}"
+        conn = self._read_conn()
+
+        trades = {}
+        for row in conn.execute(f"SELECT * FROM trades{where} ORDER BY rowid", params):
+            trades[row["token_address"]] = {
+                "ticker": row["ticker"],
+                "call_cap": row["call_cap"],
+                "entry_cap": row["entry_cap"],
+                "tokens": row["tokens"],
+                "sell_cap": [],
+                "sell_percent": [],
+                "tokens_for_sale": [],
+                "buy_transaction": row["buy_transaction"],
+                "sell_transactions": [],
+                "total_pnl": row["total_pnl"],
+                "entry_time": row["entry_time"],
+                "exit_time": row["exit_time"],
+                "signature_time": row["signature_time"],
+                "call_sources": []
+            }
+        if not trades:
+            return trades
+        for row in conn.execute(f"SELECT * FROM sells WHERE token_address IN ({selected}) ORDER BY id", params):
+            trade = trades.get(row["token_address"])
+            if trade is None:
+                continue
+            trade["sell_transactions"].append(row["sell_transaction"])
+            trade["sell_cap"].append(row["sell_cap"])
+            trade["sell_percent"].append(row["sell_percent"])
+            trade["tokens_for_sale"].append(row["tokens_for_sale"])
+        for row in conn.execute(f"SELECT token_address, channel FROM call_sources "
+                                f"WHERE token_address IN ({selected}) ORDER BY call_time, id", params):
+            trade = trades.get(row["token_address"])
+            if trade is not None:
+                trade["call_sources"].append(row["channel"])
+        return trades
+
+    def import_json(self, json_path: str) -> int:
+        """Импортирует сделки из старого trades.json одной транзакцией"""
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return 0
+
+        conn = self._connect()
+        try:
+            with conn:
+                for token_address, trade in legacy.items():
+                    conn.execute(INSERT_TRADE_SQL, _trade_params(token_address, trade))
+                    sell_caps = trade.get("sell_cap", [])
+                    sell_percents = trade.get("sell_percent", [])
+                    tokens_for_sale = trade.get("tokens_for_sale", [])
+                    for i, sell_transaction in enumerate(trade.get("sell_transactions", [])):
+                        conn.execute(
+                            INSERT_SELL_SQL,
+                            (token_address, sell_transaction,
+                             sell_caps[i] if i < len(sell_caps) else None,
+                             sell_percents[i] if i < len(sell_percents) else None,
+                             tokens_for_sale[i] if i < len(tokens_for_sale) else None)
+                        )
+                    for channel in trade.get("call_sources", []):
+                        conn.execute(INSERT_CALL_SOURCE_SQL, (token_address, channel, None))
+        finally:
+            conn.close()
+        return len(legacy)
+
+    # ---------- запросы и статистика ----------
+
+    def _read_conn(self) -> sqlite3.Connection:
+        """Постоянное соединение для чтения (видит всё, что уже закоммитил писатель)"""
+        if self._reader is None:
+            self._reader = self._connect()
+        return self._reader
+
+    @staticmethod
+    def _period(prefix: str) -> Tuple[str, str]:
+        """
+        Префикс entry_time ('2026', '2026-10', '2026-10-17', '2026-10-17 14', ...) -> [начало, начало следующего периода).
+        Нераспознанный префикс - строковый диапазон [prefix, следующая строка): то же, что startswith
+        """
+        for fmt, step in _PREFIX_PERIODS:
+            try:
+                start = datetime.strptime(prefix, fmt)
+            except ValueError:
+                continue
+            if start.strftime(fmt) != prefix:
+                continue  # '2026-1' - не месяц, а префикс строки
+            if step == "year":
+                end = start.replace(year=start.year + 1)
+            elif step == "month":
+                end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+            else:
+                end = start + timedelta(**{step: 1})
+            return start.strftime(ENTRY_TIME_FORMAT), end.strftime(ENTRY_TIME_FORMAT)
+        return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    def _build_filter(self, date_from: str = None, date_to: str = None, mint: str = None,
+                      ticker: str = None, min_pnl: float = None, max_pnl: float = None,
+                      min_hold: float = None, max_hold: float = None,
+                      closed_only: bool = False) -> Tuple[str, list]:
+        clauses = []
+        params = []
+        if mint:
+            clauses.append("token_address = ?")
+            params.append(mint)
+        if ticker:
+            clauses.append("ticker = ? COLLATE NOCASE")
+            params.append(ticker)
+        # Границы - префиксы entry_time: date_to='2026-10' включает весь октябрь
+        if date_from:
+            clauses.append("entry_time >= ?")
+            params.append(self._period(date_from)[0])
+        if date_to:
+            clauses.append("entry_time < ?")
+            params.append(self._period(date_to)[1])
+        if min_pnl is not None:
+            clauses.append("total_pnl >= ?")
+            params.append(min_pnl)
+        if max_pnl is not None:
+            clauses.append("total_pnl <= ?")
+            params.append(max_pnl)
+        if closed_only or min_hold is not None or max_hold is not None:
+            clauses.append("exit_time IS NOT NULL")
+        if min_hold is not None:
+            clauses.append(f"{HOLD_SECONDS_SQL} >= ?")
+            params.append(min_hold)
+        if max_hold is not None:
+            clauses.append(f"{HOLD_SECONDS_SQL} <= ?")
+            params.append(max_hold)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+
+    def query_trades(self, limit: int = None, **filters) -> List[dict]:
+        """
+        Сделки по фильтрам (индексы по mint, ticker и entry_time).
+        filters: date_from, date_to, mint, ticker, min_pnl, max_pnl, min_hold, max_hold, closed_only.
+        """
+        where, params = self._build_filter(**filters)
+        sql = (f"SELECT *, CASE WHEN exit_time IS NOT NULL THEN {HOLD_SECONDS_SQL} END AS hold_seconds "
+               f"FROM trades{where} ORDER BY entry_time")
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._read_conn().execute(sql, params)]
+
+    def get_pnl_stats(self, **filters) -> dict:
+        """
+        Агрегаты по закрытым сделкам, считаются в SQLite без загрузки истории:
+        количество, win rate, средний и медианный PnL, PnL-взвешенное время удержания.
+        """
+        filters["closed_only"] = True
+        where, params = self._build_filter(**filters)
+        conn = self._read_conn()
+
+        row = conn.execute(
+            f"SELECT COUNT(*) AS trades, "
+            f"SUM(CASE WHEN total_pnl > 0 THEN 1 ELSE 0 END) AS wins, "
+            f"AVG(total_pnl) AS avg_pnl, "
+            f"SUM(total_pnl) AS sum_pnl, "
+            f"AVG({HOLD_SECONDS_SQL}) AS avg_hold, "
+            f"SUM(ABS(total_pnl) * {HOLD_SECONDS_SQL}) AS weighted_hold, "
+            f"SUM(ABS(total_pnl)) AS abs_pnl "
+            f"FROM trades{where}",
+            params
+        ).fetchone()
+
+        count = row["trades"] or 0
+        median_pnl = None
+        if count:
+            # Медиана: одно или два средних значения через OFFSET по отсортированному PnL
+            offset = (count - 1) // 2
+            take = 2 if count % 2 == 0 else 1
+            middle = [r[0] for r in conn.execute(
+                f"SELECT total_pnl FROM trades{where} ORDER BY total_pnl LIMIT ? OFFSET ?",
+                params + [take, offset]
+            )]
+            median_pnl = sum(middle) / len(middle)
+
+        return {
+            "trades": count,
+            "wins": row["wins"] or 0,
+            "win_rate": (row["wins"] or 0) / count * 100 if count else 0.0,
+            "avg_pnl": row["avg_pnl"],
+            "median_pnl": median_pnl,
+            "total_pnl": row["sum_pnl"] or 0.0,
+            "avg_hold_seconds": row["avg_hold"],
+            "pnl_weighted_hold_seconds": (row["weighted_hold"] / row["abs_pnl"]) if row["abs_pnl"] else None
+        }
@@ -1,35 +1,52 @@
+import atexit
 import json
 import os
-import time
+import sys
 from datetime import datetime
 from typing import Dict, Optional, List
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.database import TradeDatabase
+from utils.cache import ExpiringDict
+from config import TRADES_DB_PATH, TRADES_JSON_PATH, CALL_DEDUPE_WINDOW
 
 class TradeLogger:
-    def __init__(self, file_path: str = "trades.json"):
-        self.file_path = file_path
+    def __init__(self, file_path: str = TRADES_JSON_PATH, db_path: str = TRADES_DB_PATH):
+        self.file_path = file_path  # старый trades.json - только для импорта/экспорта
+        self.db = TradeDatabase(db_path)
+        
+        # Первый запуск на журнале: переносим историю из trades.json
+        if self.db.is_empty() and os.path.exists(self.file_path):
+            imported = self.db.import_json(self.file_path)
+            print(f"📥 Импортировано сделок из {self.file_path}: {imported}")
+            
+        # В памяти - только незакрытые сделки; история читается из SQLite по запросу
         self.trades = self._load_trades()
-        # Создаем пустой файл если его нет
-        if not os.path.exists(self.file_path):
-            self._save_trades()
+        # Минты всех записанных сделок: повторную покупку отсекаем без чтения SQLite на пути покупки
+        self.known_mints = self.db.load_mints()
+        # Источники сигнала до записи покупки: mint -> {канал: время колла}.
+        # В журнал попадают только вместе со сделкой
+        self.pending_sources = ExpiringDict(CALL_DEDUPE_WINDOW)
         
     def _load_trades(self) -> Dict:
-        """Загружает существующие сделки из JSON файла"""
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return {}
-        return {}
+        """Восстанавливает незакрытые сделки из журнала (время старта не растёт с историей)"""
+        return self.db.load_open()
         
-    def _save_trades(self):
-        """Сохраняет сделки в JSON файл"""
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.trades, f, indent=2, ensure_ascii=False)
+    def export_json(self, path: str = None):
+        """Выгружает всю историю в формате trades.json (снимок по запросу, не на каждом событии)"""
+        self.db.flush()
+        with open(path or self.file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.db.load_all(), f, indent=2, ensure_ascii=False)
+            
+    def close(self):
+        """Дописывает журнал на диск и останавливает фоновую запись"""
+        self.db.flush()
+        self.db.close()
             
     def add_buy(self, token_address: str, ticker: str, entry_cap: float, buy_signature: str, call_cap: float = None, tokens: float = None, signature_time: float = None):
         """Добавляет информацию о покупке"""
-        if token_address not in self.trades:
+        # Закрытые сделки в памяти не держим - повторную покупку того же токена отсекает known_mints
+        if token_address not in self.known_mints:
+            self.known_mints.add(token_address)
             # Конвертируем время в миллисекунды если оно передано
             signature_time_ms = signature_time * 1000 if signature_time else None
             
@@ -46,9 +63,28 @@ class TradeLogger:
                 "total_pnl": 0.0,
                 "entry_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "exit_time": None,
-                "signature_time": signature_time_ms
+                "signature_time": signature_time_ms,
+                "call_sources": []
             }
-            self._save_trades()
+            self.db.insert_trade(token_address, self.trades[token_address])
+            for channel, call_time in self.pending_sources.pop(token_address, {}).items():
+                self.add_call_source(token_address, channel, call_time)
+            
+    def add_call_source(self, token_address: str, channel: str, call_time: float = None):
+        """Записывает канал, опубликовавший контракт (первый - тот, по которому вошли)"""
+        if token_address not in self.trades:
+            # Покупки ещё нет - держим до add_buy (сделка может и не состояться)
+            self.pending_sources.setdefault(token_address, {}).setdefault(channel, call_time)
+            return
+        sources = self.trades[token_address].setdefault("call_sources", [])
+        if channel in sources:
+            return
+        sources.append(channel)
+        self.db.insert_call_source(token_address, channel, call_time)
+        
+    def drop_call_sources(self, token_address: str):
+        """Забывает источники колла, по которому сделка не состоялась"""
+        self.pending_sources.pop(token_address, None)
             
     def add_sell(self, token_address: str, sell_signature: str, sell_cap: float, sell_percent: float, tokens_for_sale: float = None):
         """Добавляет информацию о продаже"""
@@ -69,7 +105,7 @@ class TradeLogger:
             self.trades[token_address]["sell_cap"].append(sell_cap)
             self.trades[token_address]["sell_percent"].append(sell_percent)
             self.trades[token_address]["tokens_for_sale"].append(tokens_for_sale)
-            self._save_trades()
+            self.db.insert_sell(token_address, sell_transaction_url, sell_cap, sell_percent, tokens_for_sale)
             
     def finalize_trade(self, token_address: str, total_pnl: float = None):
         """Завершает сделку и рассчитывает итоговый PnL"""
@@ -80,7 +116,9 @@ class TradeLogger:
             
             self.trades[token_address]["total_pnl"] = total_pnl
             self.trades[token_address]["exit_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._save_trades()
+            self.db.finalize_trade(token_address, total_pnl, self.trades[token_address]["exit_time"])
+            # Закрытая сделка дальше живёт только в журнале
+            del self.trades[token_address]
             
     def _calculate_total_pnl(self, token_address: str) -> float:
         """Рассчитывает итоговый PnL по формуле: (токены_которые_продали / tokens * пнл_продажи_%) + ..."""
@@ -94,6 +132,9 @@ class TradeLogger:
             
         total_pnl = 0.0
         for i, tokens_sold in enumerate(tokens_for_sale):
+            # Продажи, импортированные из старого trades.json, могут быть без количества
+            if tokens_sold is None:
+                continue
             if i < len(sell_percent):
                 # PnL = (токены_которые_продали / tokens * пнл_продажи_%)
                 pnl_contribution = (tokens_sold / total_tokens) * sell_percent[i]
@@ -102,20 +143,37 @@ class TradeLogger:
         return total_pnl
             
     def get_trade_summary(self, token_address: str) -> Optional[Dict]:
-        """Получает сводку по сделке"""
-        return self.trades.get(token_address)
+        """Получает сводку по сделке (открытая - из памяти, закрытая - из журнала)"""
+        trade = self.trades.get(token_address)
+        if trade is not None:
+            return trade
+        self.db.flush()
+        return self.db.load_trades(mint=token_address).get(token_address)
         
-    def get_all_trades(self) -> Dict:
-        """Получает все сделки"""
+    def get_open_trades(self) -> Dict:
+        """Незакрытые сделки"""
         return self.trades
         
+    def get_all_trades(self) -> Dict:
+        """Получает все сделки (вся история читается из журнала - только для выгрузок)"""
+        self.db.flush()
+        return self.db.load_all()
+        
     def get_trades_by_date(self, date: str) -> Dict:
-        """Получает сделки за определенную дату"""
-        filtered_trades = {}
-        for token_address, trade_data in self.trades.items():
-            if trade_data.get("entry_time", "").startswith(date):
-                filtered_trades[token_address] = trade_data
-        return filtered_trades
+        """Сделки за период по префиксу entry_time: '2026', '2026-10', '2026-10-17' (по индексу entry_time)"""
+        self.db.flush()
+        return self.db.load_trades(date_from=date, date_to=date)
+        
+    def query_trades(self, **filters) -> List[Dict]:
+        """Сделки по диапазону дат, минту, тикеру, PnL и времени удержания (см. TradeDatabase.query_trades)"""
+        self.db.flush()
+        return self.db.query_trades(**filters)
+        
+    def get_stats(self, **filters) -> Dict:
+        """Win rate, средний/медианный PnL и PnL-взвешенное время удержания по закрытым сделкам"""
+        self.db.flush()
+        return self.db.get_pnl_stats(**filters)
 
 # Глобальный экземпляр логгера
-trade_logger = TradeLogger() 
\ No newline at end of file
+trade_logger = TradeLogger()
+atexit.register(trade_logger.close)
@@ -5,8 +5,13 @@ import time
 from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 from trading.wizard_trader import WizardTrader
+from trading.intake import call_intake
 from TGparser import find_solana_contract
 from TokenMonitor import token_monitor
+from utils.transport import transport
+from utils.price_feed import sol_price_feed
+from utils.tracing import tracer
+from utils.capture import capture
 from config import *
 
 # --------------- клиент Telegram ---------------
@@ -24,31 +29,96 @@ if APP != "Wizard":
 trader = WizardTrader(wizard_chat_id)
 
 # --------------- обработчик новых постов ---------------
-@client.on(events.NewMessage(chats=[channel_username]))
+@client.on(events.NewMessage(chats=channel_usernames))
 async def handler(event):
     call_time = time.time()
-    data = find_solana_contract(event.raw_text)
+    # Telegram отдаёт время поста с точностью до секунды
+    tracer.record_since("message_receive", event.date.timestamp() if event.date else None, call_time)
+    with tracer.span("parse"):
+        data = find_solana_contract(event.raw_text)
     if not data:
         return
 
-    if max_mcap and data.get("mcap", 0) > max_mcap:
+    # До приёма: отклонённый пост не считается сделкой, не пишется в источники и не блокирует повторы
+    if max_mcap and data.get("mcap") and data["mcap"] > max_mcap:
         print(f"❌ Макеткап {data['mcap']} выше лимита")
         return
 
-    print(f"📢 Новое сообщение: [{data.get('ticker') or '???'}] {data['contract']}")
+    # Один контракт из нескольких каналов - одна сделка, повторы пишем как источники
+    source = getattr(event.chat, "username", None) or str(event.chat_id)
+    if not call_intake.register(data["contract"], source, call_time):
+        return
+
+    print(f"📢 Новое сообщение ({source}): [{data.get('ticker') or '???'}] {data['contract']}")
     ok = await trader.trade_token(data["contract"],
                                   data.get("ticker"),
                                   call_time,
                                   data.get("mcap"),
                                   client)
+    if not ok:
+        # Сделки нет - повтор из другого канала не должен отсекаться окном дедупа
+        call_intake.release(data["contract"])
     print("✅ Сделка завершена" if ok else "❌ Ошибка торговли")
 
+# --------------- прогрев ---------------
+async def warm_up():
+    """До первого колла: сущности Telegram в кэше, соединения RPC/WS/цены открыты"""
+    start = time.perf_counter()
+
+    async def timed(name, coro):
+        step_start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coro, WARMUP_TIMEOUT)
+            return name, (time.perf_counter() - step_start) * 1000, result, None
+        except Exception as e:
+            return name, (time.perf_counter() - step_start) * 1000, None, e
+
+    async def resolve_channels():
+        return [await client.get_input_entity(channel) for channel in channel_usernames]
+
+    steps = await asyncio.gather(
+        timed("Wizard", trader.warm_up(client)),
+        timed("каналы", resolve_channels()),
+        timed("RPC", transport.warm_up()),
+        timed("WebSocket", token_monitor.wait_subscribed(WARMUP_TIMEOUT / 2)),
+        timed("цена SOL", sol_price_feed.wait_ready(WARMUP_TIMEOUT / 2)),
+    )
+
+    hot = True
+    for name, elapsed_ms, result, error in steps:
+        if error is None and name == "RPC":
+            failed = [r for r in result if 'error' in r]
+            error = "; ".join(f"{r['url']}: {r['error']}" for r in failed) if failed else None
+            if not failed:
+                name += " (" + ", ".join(f"{r['warm_ms']:.0f} мс" for r in result) + ")"
+        elif error is None and not result:
+            error = "не готово"
+        if error is not None:
+            hot = False
+            print(f"⚠️ Прогрев {name}: {error}")
+        else:
+            print(f"   ✅ {name}: {elapsed_ms:.0f} мс")
+    total_ms = (time.perf_counter() - start) * 1000
+    print(f"🔥 Бот прогрет за {total_ms:.0f} мс" if hot else f"🌡️ Прогрев неполный ({total_ms:.0f} мс)")
+
 # --------------- запуск ---------------
 async def main():
-    await token_monitor.start_monitoring()
-    await client.start()
-    print("🚀 Бот запущен")
-    await client.run_until_disconnected()
+    await transport.start()
+    await sol_price_feed.start()
+    # Отчёт по задержкам этапов: kill -USR1 <pid>
+    tracer.install_signal_handler(asyncio.get_running_loop())
+    try:
+        await token_monitor.start_monitoring()
+        await client.start()
+        await warm_up()
+        print("🚀 Бот запущен")
+        await client.run_until_disconnected()
+    finally:
+        await token_monitor.stop_monitoring()
+        tracer.dump()
+        capture.close()
+        await sol_price_feed.stop()
+        await transport.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
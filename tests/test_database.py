@@ -0,0 +1,44 @@
+from database.database import TradeDatabase
+
+
+def _journal(tmp_path, entry_times):
+    db = TradeDatabase(str(tmp_path / "trades.db"))
+    for i, entry_time in enumerate(entry_times):
+        db.insert_trade(f"mint{i}", {"ticker": f"T{i}", "entry_time": entry_time})
+    db.flush()
+    return db
+
+
+def _by_prefix(db, prefix):
+    return sorted(trade["entry_time"] for trade in db.load_trades(date_from=prefix, date_to=prefix).values())
+
+
+def test_month_prefix(tmp_path):
+    db = _journal(tmp_path, ["2026-09-30 23:59:59", "2026-10-01 00:00:00", "2026-10-31 23:59:59",
+                             "2026-11-01 00:00:00"])
+    try:
+        assert _by_prefix(db, "2026-10") == ["2026-10-01 00:00:00", "2026-10-31 23:59:59"]
+        # Декабрь переходит в следующий год
+        assert _by_prefix(db, "2026-12") == []
+    finally:
+        db.close()
+
+
+def test_year_prefix(tmp_path):
+    db = _journal(tmp_path, ["2025-12-31 23:59:59", "2026-01-01 00:00:00", "2026-12-31 23:59:59",
+                             "2027-01-01 00:00:00"])
+    try:
+        assert _by_prefix(db, "2026") == ["2026-01-01 00:00:00", "2026-12-31 23:59:59"]
+    finally:
+        db.close()
+
+
+def test_day_hour_and_full_time(tmp_path):
+    db = _journal(tmp_path, ["2026-10-17 13:59:59", "2026-10-17 14:00:00", "2026-10-17 14:59:59",
+                             "2026-10-18 00:00:00"])
+    try:
+        assert len(_by_prefix(db, "2026-10-17")) == 3
+        assert _by_prefix(db, "2026-10-17 14") == ["2026-10-17 14:00:00", "2026-10-17 14:59:59"]
+        assert _by_prefix(db, "2026-10-17 14:00:00") == ["2026-10-17 14:00:00"]
+    finally:
+        db.close()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from typing import List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cache import ExpiringDict
+from database.trade_logger import trade_logger
+from config import CALL_DEDUPE_WINDOW
+
+
+class CallRecord:
+    """Один контракт в окне дедупа: кто опубликовал первым и кто повторил"""
+    __slots__ = ('contract', 'first_source', 'first_time', 'sources')
+
+    def __init__(self, contract: str, source: str, call_time: float):
+        self.contract = contract
+        self.first_source = source
+        self.first_time = call_time
+        self.sources: List[str] = [source]
+
+
+class CallIntake:
+    """
+    Приём сигналов из нескольких каналов.
+    Первый пост с контрактом уходит в торговлю сразу, повторы того же
+    контракта (из любого канала) в пределах окна только дописываются
+    к сделке как дополнительные источники - без второй покупки.
+    """
+
+    def __init__(self, window: float = CALL_DEDUPE_WINDOW):
+        self.calls = ExpiringDict(window)  # contract -> CallRecord
+        self.stats = {
+            'calls': 0,       # постов с контрактом
+            'dispatched': 0,  # ушло в торговлю
+            'duplicates': 0,  # повторов, записанных как источники
+            'released': 0     # контрактов, снятых после несостоявшейся сделки
+        }
+
+    def register(self, contract: str, source: str, call_time: Optional[float] = None) -> bool:
+        """True - контракт пришёл впервые и его нужно торговать, False - повтор"""
+        call_time = call_time or time.time()
+        self.stats['calls'] += 1
+
+        record = self.calls.get(contract)
+        if record is not None:
+            self.stats['duplicates'] += 1
+            if source not in record.sources:
+                record.sources.append(source)
+                trade_logger.add_call_source(contract, source, call_time)
+            delay = call_time - record.first_time
+            print(f"🔁 {contract[:8]}... уже в работе (первый: {record.first_source}), "
+                  f"повтор из {source} через {delay:.1f} с")
+            return False
+
+        # Проверка и запись без await между ними - гонки между обработчиками нет
+        self.calls[contract] = CallRecord(contract, source, call_time)
+        self.stats['dispatched'] += 1
+        trade_logger.add_call_source(contract, source, call_time)
+        return True
+
+    def release(self, contract: str):
+        """
+        Сделка не состоялась (отказ по капе, покупка не найдена): контракт снова
+        принимается из любого канала, накопленные источники не пишутся в журнал
+        """
+        if self.calls.pop(contract, None) is not None:
+            self.stats['released'] += 1
+        trade_logger.drop_call_sources(contract)
+
+    def get_sources(self, contract: str) -> List[str]:
+        """Все каналы, опубликовавшие контракт в пределах окна"""
+        record = self.calls.get(contract)
+        return list(record.sources) if record else []
+
+
+# Глобальный экземпляр приёма сигналов
+call_intake = CallIntake()
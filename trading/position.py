@@ -0,0 +1,106 @@
+import asyncio
+from typing import List, Optional
+
+
+class PositionState:
+    """Состояния позиции: ждём покупку -> открыта -> полностью продана"""
+    WAITING_BUY = "waiting_buy"
+    OPEN = "open"
+    CLOSED = "closed"
+
+
+class SellFill:
+    """Одна продажа по позиции (только нужные числа, без всего tx_info)"""
+    __slots__ = ('signature', 'amount', 'sol_received_wallet', 'sol_received_pure')
+
+    def __init__(self, signature: str, amount: float, sol_received_wallet: float = 0.0,
+                 sol_received_pure: Optional[float] = None):
+        self.signature = signature
+        self.amount = amount
+        self.sol_received_wallet = sol_received_wallet
+        self.sol_received_pure = sol_received_pure
+
+
+class Position:
+    """
+    Отслеживаемая позиция по токену.
+    Переходы состояний только через open()/add_sell()/cancel(),
+    события buy_event/closed_event будят ожидающих в TokenMonitor.
+    Продажа, разобранная раньше своей покупки (воркеры работают параллельно),
+    откладывается и применяется в open().
+    """
+    __slots__ = ('token_address', 'ticker', 'state', 'entry_mcap',
+                 'buy_signature', 'token_amount', 'sol_spent_wallet', 'sol_spent_pure',
+                 'remaining_position', 'sells', 'pending_sells', 'buy_event', 'closed_event')
+
+    def __init__(self, token_address: str, ticker: Optional[str] = None):
+        self.token_address = token_address
+        self.ticker = ticker
+        self.state = PositionState.WAITING_BUY
+        self.entry_mcap = 0.0
+
+        self.buy_signature: Optional[str] = None
+        self.token_amount = 0.0
+        self.sol_spent_wallet = 0.0
+        self.sol_spent_pure: Optional[float] = None
+
+        self.remaining_position = 0.0
+        self.sells: List[SellFill] = []
+        self.pending_sells: List[SellFill] = []  # продажи, пришедшие до покупки
+
+        self.buy_event = asyncio.Event()
+        self.closed_event = asyncio.Event()
+
+    @property
+    def is_bought(self) -> bool:
+        return self.buy_signature is not None
+
+    def open(self, signature: str, token_amount: float, sol_spent_wallet: float = 0.0,
+             sol_spent_pure: Optional[float] = None) -> bool:
+        """WAITING_BUY -> OPEN. False, если покупка уже была"""
+        if self.state != PositionState.WAITING_BUY:
+            return False
+        self.buy_signature = signature
+        self.token_amount = token_amount
+        self.sol_spent_wallet = sol_spent_wallet
+        self.sol_spent_pure = sol_spent_pure
+        self.remaining_position = token_amount
+        self.state = PositionState.OPEN
+        self.buy_event.set()
+        # Продажи, обогнавшие покупку
+        pending, self.pending_sells = self.pending_sells, []
+        for fill in pending:
+            self.add_sell(fill)
+        return True
+
+    def add_sell(self, fill: SellFill) -> bool:
+        """Учитывает продажу. OPEN -> CLOSED, когда позиция продана полностью; до покупки - откладывает"""
+        if self.state == PositionState.WAITING_BUY:
+            self.pending_sells.append(fill)
+            return True
+        if self.state != PositionState.OPEN:
+            return False
+        self.sells.append(fill)
+        self.remaining_position -= fill.amount
+        if self.remaining_position <= 0:
+            self.state = PositionState.CLOSED
+            self.closed_event.set()
+        return True
+
+    def cancel(self):
+        """Позиция снята с отслеживания - будим всех ожидающих"""
+        self.buy_event.set()
+        self.closed_event.set()
+
+    def buy_info(self) -> Optional[dict]:
+        """Детали покупки в прежнем формате tx_info"""
+        if not self.is_bought:
+            return None
+        return {
+            "direction": "buy",
+            "signature": self.buy_signature,
+            "token_address": self.token_address,
+            "token_amount": self.token_amount,
+            "sol_spent_wallet": self.sol_spent_wallet,
+            "sol_spent_pure": self.sol_spent_pure
+        }
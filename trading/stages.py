@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.tracing import tracer
+
+
+class StageFailed(Exception):
+    """Этап не выполнен: таймаут, ошибка или упала зависимость"""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"{stage}: {reason}")
+        self.stage = stage
+        self.reason = reason
+
+
+class Stage:
+    __slots__ = ('name', 'func', 'deps', 'timeout')
+
+    def __init__(self, name: str, func: Callable[..., Awaitable[Any]], deps: Iterable[str] = (),
+                 timeout: Optional[float] = None):
+        self.name = name
+        self.func = func          # корутина, аргументы - результаты deps по порядку
+        self.deps = tuple(deps)
+        self.timeout = timeout
+
+
+class StageScheduler:
+    """
+    Этапы сделки с зависимостями. Всё, что ни от чего не зависит,
+    стартует сразу в start(); этап ждёт только свои зависимости
+    и ограничен своим таймаутом. Длительность этапа (без ожидания
+    зависимостей) пишется в tracer под его именем.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], deps: Iterable[str] = (),
+            timeout: Optional[float] = None) -> "StageScheduler":
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Этап {name}: неизвестная зависимость {dep}")
+        self.stages[name] = Stage(name, func, deps, timeout)
+        return self
+
+    def start(self):
+        """Запускает все этапы; каждый сам дождётся своих зависимостей"""
+        for name, stage in self.stages.items():
+            if name not in self.tasks:
+                task = asyncio.create_task(self._run(stage))
+                task.add_done_callback(self._on_done)
+                self.tasks[name] = task
+
+    @staticmethod
+    def _on_done(task: asyncio.Task):
+        """
+        Забирает и печатает ошибку этапа. Иначе этап, упавший после того, как его
+        результат перестали ждать (result_nowait), asyncio выдаёт как
+        'Task exception was never retrieved'
+        """
+        if task.cancelled():
+            return
+        error = task.exception()
+        # Падение зависимости уже напечатал её собственный этап
+        if error is not None and not isinstance(error.__cause__, StageFailed):
+            print(f"⚠️ Этап {error}")
+
+    async def _run(self, stage: Stage):
+        args = []
+        for dep in stage.deps:
+            try:
+                # shield: отмена зависимого этапа не отменяет общую зависимость
+                args.append(await asyncio.shield(self.tasks[dep]))
+            except StageFailed as e:
+                raise StageFailed(stage.name, f"зависимость {e}") from e
+
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(stage.func(*args), stage.timeout)
+        except asyncio.TimeoutError:
+            raise StageFailed(stage.name, f"таймаут {stage.timeout:g} с") from None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise StageFailed(stage.name, str(e) or type(e).__name__) from e
+        finally:
+            tracer.record(stage.name, (time.perf_counter() - start) * 1000)
+
+    async def result(self, name: str) -> Any:
+        """Результат этапа (StageFailed, если этап не выполнен)"""
+        return await asyncio.shield(self.tasks[name])
+
+    async def result_or(self, name: str, default: Any = None) -> Any:
+        """Результат этапа или default, если он не выполнен (ошибку печатает _on_done)"""
+        try:
+            return await self.result(name)
+        except StageFailed:
+            return default
+
+    def result_nowait(self, name: str, default: Any = None) -> Any:
+        """Результат, если этап уже успешно завершён, иначе default - не ждём"""
+        task = self.tasks.get(name)
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return default
+        return task.result()
+
+    def cancel(self):
+        """Отменяет все незавершённые этапы (например, покупка так и не появилась)"""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
@@ -1,55 +1,193 @@
-import aiohttp
 import asyncio
-from typing import Optional
+import aiohttp
+import time
+from abc import ABC, abstractmethod
+import sys
+import os
+from typing import Dict, Iterable, List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transport import transport
+from utils.cache import AsyncTTLCache
+from config import (DEXSCREENER_URL, DEXSCREENER_RATE, POOL_BATCH_WINDOW_MS,
+                    POOL_CACHE_TTL, POOL_NEGATIVE_TTL, POOL_CACHE_SIZE)
+
+# /tokens/v1/{chain}/{адреса через запятую} принимает до 30 адресов
+DEXSCREENER_BATCH_MAX = 30
+
+
+def best_pairs(pairs: Iterable[dict], mints: Iterable[str]) -> Dict[str, Optional[dict]]:
+    """mint -> самая ликвидная пара на Solana (None - пула нет). Один проход, без сортировки"""
+    best: Dict[str, Optional[dict]] = dict.fromkeys(mints)
+    liquidity: Dict[str, float] = {}
+    for pair in pairs:
+        if pair.get("chainId") != "solana":
+            continue
+        pair_liquidity = float((pair.get("liquidity") or {}).get("usd") or 0)
+        # Минт может стоять в паре и базой, и котировкой
+        for side in ("baseToken", "quoteToken"):
+            mint = (pair.get(side) or {}).get("address")
+            if mint in best and pair_liquidity >= liquidity.get(mint, -1.0):
+                best[mint] = pair
+                liquidity[mint] = pair_liquidity
+    return best
+
+
+class RateLimiter:
+    """Token bucket: не больше rate запросов в секунду, всплеск до burst"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.waits = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.waits += 1
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PairResolver(ABC):
+    """
+    Источник пар для PoolFinder: resolve(mints) -> mint -> лучшая пара или None (пула нет).
+    Исключение - сбой источника: такой результат не кэшируется.
+    Подменяется, например, локальным фикстур-сервером или словарём в тестах.
+    """
+    max_batch = DEXSCREENER_BATCH_MAX
+
+    @abstractmethod
+    async def resolve(self, mints: List[str]) -> Dict[str, Optional[dict]]:
+        """mint -> лучшая пара или None для каждого из mints"""
+
+
+class DexScreenerResolver(PairResolver):
+    """Пачка минтов - один запрос /tokens/v1/solana, через ограничитель частоты"""
+
+    def __init__(self, base_url: str = DEXSCREENER_URL, rate: float = DEXSCREENER_RATE, timeout: float = 5.0):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = RateLimiter(rate)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept': 'application/json'
+        }
+
+    async def resolve(self, mints: List[str]) -> Dict[str, Optional[dict]]:
+        await self.limiter.acquire()
+        session = await transport.get_session()
+        url = f"{self.base_url}/tokens/v1/solana/{','.join(mints)}"
+        async with session.get(url, headers=self.headers, timeout=self.timeout) as resp:
+            if resp.status == 429:
+                raise RuntimeError("DexScreener: превышен лимит запросов (429)")
+            if resp.status != 200:
+                raise RuntimeError(f"DexScreener HTTP {resp.status}")
+            data = await resp.json()
+        # Старый формат /latest/dex/tokens отдаёт {"pairs": [...]}, v1 - сразу список
+        pairs = (data.get("pairs") or []) if isinstance(data, dict) else (data or [])
+        return best_pairs(pairs, mints)
+
 
 class PoolFinder:
-    def __init__(self):
-        self.session = None
-        
-    async def init_session(self):
-        """Инициализирует постоянную сессию"""
-        if self.session is None:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json'
-            }
-                
-            self.session = aiohttp.ClientSession(
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=10)
-            )
-            print("🔗 Соединение с DexScreener установлено")
+    """
+    Индекс пулов: mint -> лучшая пара.
+    Найденные пары живут POOL_CACHE_TTL, «пула нет» - POOL_NEGATIVE_TTL
+    (у свежего токена пул может появиться позже), сбои не кэшируются.
+    Одновременные запросы одного минта объединяются, разные минты
+    за окно POOL_BATCH_WINDOW_MS уходят одним запросом к resolver.
+    """
+
+    def __init__(self, resolver: Optional[PairResolver] = None, window: float = POOL_BATCH_WINDOW_MS / 1000,
+                 ttl: float = POOL_CACHE_TTL, negative_ttl: float = POOL_NEGATIVE_TTL,
+                 maxsize: int = POOL_CACHE_SIZE):
+        self.resolver = resolver or DexScreenerResolver()
+        self.window = window
+        self.cache = AsyncTTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=negative_ttl)
+        self.waiters: Dict[str, asyncio.Future] = {}  # mint -> результат следующего batch
+        self.queue: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.stats = {'batches': 0, 'requested': 0, 'found': 0, 'errors': 0}
+
+    def set_resolver(self, resolver: PairResolver):
+        self.resolver = resolver
+        self.cache = AsyncTTLCache(maxsize=self.cache.maxsize, ttl=self.cache.ttl,
+                                   negative_ttl=self.cache.negative_ttl)
+
+    async def find_pair(self, token_mint: str) -> Optional[dict]:
+        """Самая ликвидная пара токена на Solana (ответ источника как есть) или None"""
+        return await self.cache.get_or_load(token_mint, lambda: self._enqueue(token_mint))
 
     async def find_pool(self, token_mint: str) -> Optional[str]:
-        """Находит лучший пул токена через DexScreener"""
-        if self.session is None:
-            await self.init_session()
-            
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token_mint}"
-        
+        """Адрес лучшего пула токена или None"""
+        pair = await self.find_pair(token_mint)
+        return pair.get("pairAddress") if pair else None
+
+    # ---------- batching ----------
+
+    def _enqueue(self, mint: str) -> asyncio.Future:
+        """Ставит минт в ближайший batch. Повторы одного минта уже отсекает кэш"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[mint] = future
+        self.queue.append(mint)
+        if len(self.queue) >= self.resolver.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        max_batch = max(1, self.resolver.max_batch)
+        while self.queue:
+            batch, self.queue = self.queue[:max_batch], self.queue[max_batch:]
+            asyncio.create_task(self._send_batch(batch))
+
+    async def _send_batch(self, batch: List[str]):
+        self.stats['batches'] += 1
+        self.stats['requested'] += len(batch)
         try:
-            async with self.session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    pairs = data.get("pairs", [])
-                    # Фильтруем только Solana пары
-                    solana_pairs = [pair for pair in pairs if pair.get("chainId") == "solana"]
-                    
-                    if solana_pairs:
-                        # Сортируем по ликвидности и берем первый
-                        solana_pairs.sort(key=lambda x: float(x.get("liquidity", {}).get("usd", 0)), reverse=True)
-                        return solana_pairs[0].get("pairAddress")
-                return None
-                    
+            found = await self.resolver.resolve(batch)
         except Exception as e:
-            print(f"❌ DexScreener ошибка: {e}")
-            return None
+            self.stats['errors'] += 1
+            print(f"❌ Поиск пулов ({len(batch)} минтов): {e}")
+            for mint in batch:
+                future = self.waiters.pop(mint, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        for mint in batch:
+            future = self.waiters.pop(mint, None)
+            pair = found.get(mint)
+            if pair is not None:
+                self.stats['found'] += 1
+            if future is not None and not future.done():
+                future.set_result(pair)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'cache': self.cache.stats()}
 
     async def close(self):
-        """Закрывает сессию"""
-        if self.session:
-            await self.session.close()
-            print("🔌 Соединение с DexScreener закрыто")
+        """Будит ожидающих неотправленного batch. Сам пул соединений закрывает transport.close()"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.queue.clear()
+        for future in self.waiters.values():
+            if not future.done():
+                future.cancel()
+        self.waiters.clear()
 
 # Глобальный экземпляр
 pool_finder = PoolFinder()
@@ -59,20 +197,22 @@ async def find_pool_fast(token_address: str) -> Optional[str]:
     return await pool_finder.find_pool(token_address)
 
 async def main():
-    """Тест"""
-    # Инициализируем сессию
-    await pool_finder.init_session()
-    
-    token_address = "AWgcTbxbMoWWt6tCsHoP6pVbspDn4b6CZBM6qdQ2bonk"
-    
-    pool = await find_pool_fast(token_address)
-    if pool:
-        print(f"✅ Пул найден: {pool}")
-    else:
-        print("❌ Пул не найден")
-    
-    # Закрываем сессию
+    """Тест: минты из аргументов (или пример) ищутся одним запросом"""
+    await transport.start()
+    token_addresses = sys.argv[1:] or ["AWgcTbxbMoWWt6tCsHoP6pVbspDn4b6CZBM6qdQ2bonk"]
+
+    pools = await asyncio.gather(*(find_pool_fast(token) for token in token_addresses), return_exceptions=True)
+    for token_address, pool in zip(token_addresses, pools):
+        if isinstance(pool, Exception):
+            print(f"❌ {token_address[:8]}...: {pool}")
+        elif pool:
+            print(f"✅ Пул {token_address[:8]}...: {pool}")
+        else:
+            print(f"❌ Пул {token_address[:8]}... не найден")
+    print(pool_finder.get_stats())
+
     await pool_finder.close()
+    await transport.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
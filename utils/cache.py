@@ -0,0 +1,187 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class _Rotating:
+    """
+    Два поколения: текущее и предыдущее. Раз в horizon/2 предыдущее
+    выбрасывается целиком, текущее становится предыдущим. Запись живёт
+    от horizon/2 до horizon секунд, память не растёт при постоянном потоке.
+    """
+
+    def __init__(self, horizon: float, factory: Callable[[], Any]):
+        self.horizon = horizon
+        self._factory = factory
+        self._current = factory()
+        self._previous = factory()
+        self._rotated_at = time.monotonic()
+
+    def _maybe_rotate(self):
+        elapsed = time.monotonic() - self._rotated_at
+        if elapsed < self.horizon / 2:
+            return
+        if elapsed >= self.horizon:
+            # Простаивали дольше горизонта - устарело всё
+            self._previous = self._factory()
+        else:
+            self._previous = self._current
+        self._current = self._factory()
+        self._rotated_at = time.monotonic()
+
+    def __len__(self) -> int:
+        self._maybe_rotate()
+        return len(self._current) + len(self._previous)
+
+
+class ExpiringSet(_Rotating):
+    """Множество с забыванием элементов через horizon секунд (дедуп сигнатур)"""
+
+    def __init__(self, horizon: float):
+        super().__init__(horizon, set)
+
+    def __contains__(self, item: Hashable) -> bool:
+        self._maybe_rotate()
+        return item in self._current or item in self._previous
+
+    def add(self, item: Hashable):
+        self._maybe_rotate()
+        self._current.add(item)
+
+    def add_if_absent(self, item: Hashable) -> bool:
+        """Добавляет элемент; False - если он уже был"""
+        if item in self:
+            return False
+        self._current.add(item)
+        return True
+
+    def discard(self, item: Hashable):
+        self._current.discard(item)
+        self._previous.discard(item)
+
+
+class ExpiringDict(_Rotating):
+    """Словарь с забыванием ключей через horizon секунд (время сигнатур)"""
+
+    def __init__(self, horizon: float):
+        super().__init__(horizon, dict)
+
+    def __contains__(self, key: Hashable) -> bool:
+        self._maybe_rotate()
+        return key in self._current or key in self._previous
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self._maybe_rotate()
+        self._current[key] = value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self._maybe_rotate()
+        if key in self._current:
+            return self._current[key]
+        return self._previous.get(key, default)
+
+    def setdefault(self, key: Hashable, value: Any) -> Any:
+        existing = self.get(key, _MISSING)
+        if existing is not _MISSING:
+            return existing
+        self._current[key] = value
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self._current.pop(key, _MISSING)
+        previous = self._previous.pop(key, _MISSING)
+        if value is _MISSING:
+            value = previous
+        return default if value is _MISSING else value
+
+
+class AsyncTTLCache:
+    """
+    Ограниченный LRU-кэш с TTL для асинхронных загрузок.
+    Одновременные запросы одного ключа объединяются: RPC-вызов
+    уходит один, остальные ждут его результат.
+    None не кэшируется, если не задан negative_ttl.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0, negative_ttl: Optional[float] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение из кэша без загрузки"""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Возвращает значение из кэша или загружает его через loader (один раз на ключ)"""
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_loaded(key, t))
+        # shield: отмена одного ожидающего не отменяет общую загрузку
+        return await asyncio.shield(task)
+
+    def _on_loaded(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if value is not None:
+            self.set(key, value)
+        elif self.negative_ttl:
+            self.set(key, None, ttl=self.negative_ttl)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0
+        }
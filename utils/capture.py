@@ -0,0 +1,160 @@
+import atexit
+import json
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from typing import Iterator, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CAPTURE_PATH
+
+# Формат файла: MAGIC, затем записи подряд (только дописываем в конец):
+#   <I длина тела> <d время получения> <B вид> <H длина ключа> ключ полезная_нагрузка
+MAGIC = b"TMCAP1\n"
+_LENGTH = struct.Struct("<I")
+_HEADER = struct.Struct("<dBH")
+
+KIND_FRAME = 1         # сырой фрейм logsNotification, ключ - кошелёк подписки
+KIND_TRANSACTION = 2   # result getTransaction (JSON), ключ - сигнатура
+KIND_TOKEN_SUPPLY = 3  # result getTokenSupply (JSON), ключ - минт
+
+_STOP = object()
+
+
+class CaptureRecord:
+    __slots__ = ('offset', 'ts', 'kind', 'key', 'payload')
+
+    def __init__(self, offset: int, ts: float, kind: int, key: str, payload: bytes):
+        self.offset = offset
+        self.ts = ts
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+
+    def json(self):
+        return json.loads(self.payload)
+
+
+class CaptureWriter:
+    """
+    Запись трафика для последующего воспроизведения.
+    Без пути - выключена (record_* ничего не делают).
+    Сериализация и запись на диск - в фоновом потоке,
+    event loop только кладёт ссылку на объект в очередь.
+    """
+
+    def __init__(self, path: Optional[str] = CAPTURE_PATH):
+        self.path = path
+        self.records = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if path:
+            self._writer = threading.Thread(target=self._writer_loop, name="capture-writer", daemon=True)
+            self._writer.start()
+            print(f"🎥 Запись трафика в {path}")
+
+    @property
+    def enabled(self) -> bool:
+        return self._writer is not None
+
+    def record_frame(self, wallet: str, frame, ts: Optional[float] = None):
+        if self._writer is not None:
+            self._queue.put((ts or time.time(), KIND_FRAME, wallet, frame))
+
+    def record_transaction(self, signature: str, result: dict, ts: Optional[float] = None):
+        if self._writer is not None:
+            self._queue.put((ts or time.time(), KIND_TRANSACTION, signature, result))
+
+    def record_token_supply(self, mint: str, result: dict, ts: Optional[float] = None):
+        if self._writer is not None:
+            self._queue.put((ts or time.time(), KIND_TOKEN_SUPPLY, mint, result))
+
+    @staticmethod
+    def _encode(ts: float, kind: int, key: str, payload) -> bytes:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif not isinstance(payload, bytes):
+            payload = json.dumps(payload, separators=(",", ":")).encode()
+        key_bytes = key.encode()
+        body = _HEADER.pack(ts, kind, len(key_bytes)) + key_bytes + payload
+        return _LENGTH.pack(len(body)) + body
+
+    def _writer_loop(self):
+        with open(self.path, "ab") as f:
+            if f.tell() == 0:
+                f.write(MAGIC)
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    f.flush()
+                    return
+                try:
+                    f.write(self._encode(*item))
+                    self.records += 1
+                except (TypeError, ValueError) as e:
+                    print(f"❌ Ошибка записи трафика: {e}")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(5.0)
+        self._writer = None
+
+
+class CaptureReader:
+    """Чтение записи через mmap: файл не загружается в память целиком"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: не файл записи трафика")
+
+    def read_at(self, offset: int) -> Optional[CaptureRecord]:
+        """Запись по смещению (None - конец файла или недописанный хвост)"""
+        data = self._map
+        if offset + _LENGTH.size > len(data):
+            return None
+        (length,) = _LENGTH.unpack_from(data, offset)
+        start = offset + _LENGTH.size
+        if start + length > len(data):
+            return None
+        ts, kind, key_length = _HEADER.unpack_from(data, start)
+        key_start = start + _HEADER.size
+        payload_start = key_start + key_length
+        return CaptureRecord(offset, ts, kind, data[key_start:payload_start].decode(),
+                             data[payload_start:start + length])
+
+    def headers(self) -> Iterator[tuple]:
+        """(offset, ts, kind, key) всех записей без копирования полезной нагрузки - для индекса"""
+        data = self._map
+        offset = len(MAGIC)
+        while offset + _LENGTH.size + _HEADER.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            start = offset + _LENGTH.size
+            if start + length > len(data):
+                return  # недописанный хвост (запись ещё идёт или процесс упал)
+            ts, kind, key_length = _HEADER.unpack_from(data, start)
+            key_start = start + _HEADER.size
+            yield offset, ts, kind, data[key_start:key_start + key_length].decode()
+            offset = start + length
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        for offset, _, _, _ in self.headers():
+            yield self.read_at(offset)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# Глобальная запись трафика (включается переменной CAPTURE_PATH)
+capture = CaptureWriter()
+atexit.register(capture.close)
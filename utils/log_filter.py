@@ -0,0 +1,40 @@
+from typing import Dict, Iterable, Optional
+
+# Программы свапов: если ни одна из них не вызывалась, транзакция
+# не может быть покупкой/продажей токена (переводы SOL, закрытие ATA, мусор роутеров)
+DEFAULT_SWAP_PROGRAMS: Dict[str, str] = {
+    "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8": "Raydium AMM v4",
+    "CPMMoo8L3F4NbTegBCKVNunggL7H1ZpdTHKxQB5qKP1C": "Raydium CPMM",
+    "CAMMCzo5YL8w4VFF8KVHrK22GGUsp5VTaW7grrKgrWqK": "Raydium CLMM",
+    "LanMV9sAd7wArD4vJFi2qDdfnVhFxYSUg6eADduJ3uj": "Raydium LaunchLab",
+    "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P": "pump.fun",
+    "pAMMBay6oceH9fJKBRHGP5D4bD4sWpmSwMn52FMfXEA": "PumpSwap",
+    "LBUZKhRxPF3XUpBCjp4YzTKgLccjZhTSDM9YuVaPwxo": "Meteora DLMM",
+    "Eo7WjKq67rjJQSZxS6z3YkapzY3eMj6Xy8X5EQVn5UaB": "Meteora Pools",
+    "cpamdpZCGKUy5JxQXB4dcpGPiikHawvSWAd6mEn1sGG": "Meteora DAMM v2",
+    "dbcij3LWUppWqq96dh6gJWwBifmcGfLSB5D4DuSMaqN": "Meteora DBC",
+    "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4": "Jupiter v6",
+}
+
+
+class LogClassifier:
+    """Определяет по логам logsNotification, вызывалась ли программа свапа"""
+
+    def __init__(self, programs: Optional[Iterable[str]] = None):
+        self.programs = frozenset(programs) if programs else frozenset(DEFAULT_SWAP_PROGRAMS)
+
+    def find_swap_program(self, logs: Optional[list]) -> Optional[str]:
+        """ID первой вызванной программы свапа или None"""
+        if not logs:
+            return None
+        for line in logs:
+            # "Program <id> invoke [N]"
+            if not line.startswith("Program ") or " invoke [" not in line:
+                continue
+            end = line.find(" ", 8)
+            if end > 0 and line[8:end] in self.programs:
+                return line[8:end]
+        return None
+
+    def is_swap(self, logs: Optional[list]) -> bool:
+        return self.find_swap_program(logs) is not None
@@ -0,0 +1,126 @@
+import asyncio
+import base64
+import struct
+import sys
+import os
+from typing import Optional, Tuple
+from solders.pubkey import Pubkey
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transport import transport
+from utils.onchain import supply_cache, get_sol_price
+from utils.PoolFinder import pool_finder
+from config import max_mcap, MCAP_CHECK_BUDGET_MS, MCAP_CHECK_FAIL_MODE, PUMP_PROGRAM
+
+_PUMP_PROGRAM = Pubkey.from_string(PUMP_PROGRAM)
+# Аккаунт bonding curve pump.fun: discriminator, virtual_token, virtual_sol, real_token, real_sol, total_supply, complete
+_CURVE = struct.Struct("<8xQQQQQ?")
+# SPL mint (и Token-2022): COption<Pubkey> mint_authority, затем supply u64 и decimals u8
+_MINT_SUPPLY_OFFSET = 36
+_MINT_SUPPLY = struct.Struct("<QB")
+LAMPORTS_PER_SOL = 1_000_000_000
+
+
+def bonding_curve_address(mint: str) -> str:
+    """PDA bonding curve минта pump.fun - без запросов в сеть"""
+    address, _ = Pubkey.find_program_address([b"bonding-curve", bytes(Pubkey.from_string(mint))], _PUMP_PROGRAM)
+    return str(address)
+
+
+def _account_data(account: Optional[dict]) -> Optional[bytes]:
+    if not account:
+        return None
+    data = account.get("data")
+    return base64.b64decode(data[0]) if data else None
+
+
+class McapChecker:
+    """
+    Оценка капы до отправки контракта в Wizard, чтобы MAX_MCAP реально отсекал покупки.
+    Основной путь - один getMultipleAccounts [bonding curve, mint] (mint - только если
+    supply ещё нет в кэше) плюс цена SOL из памяти. Токены, ушедшие с кривой,
+    оцениваются через DexScreener (PoolFinder) - это HTTP с ограничением частоты,
+    в бюджет по умолчанию укладывается только из кэша пулов (см. config.py).
+    Оценка ограничена MCAP_CHECK_BUDGET_MS; не уложились или не смогли - решает MCAP_CHECK_FAIL_MODE.
+    """
+
+    def __init__(self, limit: Optional[float] = max_mcap, budget_ms: int = MCAP_CHECK_BUDGET_MS,
+                 fail_open: bool = MCAP_CHECK_FAIL_MODE == "open"):
+        self.limit = limit
+        self.budget = budget_ms / 1000
+        self.fail_open = fail_open
+        self.stats = {'checked': 0, 'passed': 0, 'rejected': 0, 'timeouts': 0, 'unknown': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.limit)
+
+    async def _read_curve(self, mint: str) -> Tuple[Optional[tuple], Optional[Tuple[float, int]]]:
+        """(резервы кривой или None, (supply, decimals) или None) одним запросом"""
+        supply_info = supply_cache.get(mint)
+        keys = [bonding_curve_address(mint)] if supply_info else [bonding_curve_address(mint), mint]
+        result = await transport.rpc_call("getMultipleAccounts",
+                                          [keys, {"encoding": "base64", "commitment": "processed"}])
+        accounts = (result or {}).get("value") or []
+        if len(accounts) != len(keys):
+            return None, supply_info
+
+        curve_data = _account_data(accounts[0])
+        curve = _CURVE.unpack_from(curve_data) if curve_data and len(curve_data) >= _CURVE.size else None
+
+        if supply_info is None:
+            mint_data = _account_data(accounts[1])
+            if mint_data and len(mint_data) >= _MINT_SUPPLY_OFFSET + _MINT_SUPPLY.size:
+                amount, decimals = _MINT_SUPPLY.unpack_from(mint_data, _MINT_SUPPLY_OFFSET)
+                supply_info = (amount / 10 ** decimals, decimals)
+                supply_cache.set(mint, supply_info)
+        return curve, supply_info
+
+    async def estimate(self, mint: str) -> Optional[float]:
+        """Капа в USD или None, если оценить не удалось"""
+        (curve, supply_info), sol_price = await asyncio.gather(self._read_curve(mint), get_sol_price())
+
+        if curve is not None and not curve[5] and supply_info and sol_price:
+            virtual_token, virtual_sol = curve[0], curve[1]
+            supply, decimals = supply_info
+            if virtual_token:
+                price_sol = (virtual_sol / LAMPORTS_PER_SOL) / (virtual_token / 10 ** decimals)
+                return price_sol * sol_price * supply
+
+        # Кривой нет или она завершена (токен мигрировал) - смотрим пул на DEX
+        pair = await pool_finder.find_pair(mint)
+        # marketCap/fdv пары - капа её базового токена: если минт в паре котировкой, это чужая капа
+        if pair and (pair.get("baseToken") or {}).get("address") == mint:
+            mcap = pair.get("marketCap") or pair.get("fdv")
+            return float(mcap) if mcap else None
+        return None
+
+    async def allows(self, mint: str) -> bool:
+        """True - покупать. Причину отказа печатает сам"""
+        if not self.enabled:
+            return True
+        self.stats['checked'] += 1
+        try:
+            mcap = await asyncio.wait_for(self.estimate(mint), self.budget)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            print(f"⏱️ Капа {mint[:8]}... не оценена за {self.budget * 1000:.0f} мс "
+                  f"({'покупаем' if self.fail_open else 'пропускаем'})")
+            return self.fail_open
+        except Exception as e:
+            mcap = None
+            print(f"❌ Ошибка оценки капы {mint[:8]}...: {e}")
+
+        if mcap is None:
+            self.stats['unknown'] += 1
+            print(f"⚠️ Капа {mint[:8]}... не определена ({'покупаем' if self.fail_open else 'пропускаем'})")
+            return self.fail_open
+        if mcap > self.limit:
+            self.stats['rejected'] += 1
+            print(f"❌ Макеткап {mcap:,.0f} выше лимита {self.limit:,.0f} | Токен: {mint[:8]}...")
+            return False
+        self.stats['passed'] += 1
+        return True
+
+
+# Глобальный экземпляр (выключен без MAX_MCAP)
+mcap_checker = McapChecker()
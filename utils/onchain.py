@@ -1,25 +1,27 @@
-import asyncio
-import aiohttp
-import re
 import sys
 import os
+from typing import Optional, Tuple
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from solana.rpc.async_api import AsyncClient
-from solders.pubkey import Pubkey
+from utils.transport import transport
+from utils.price_feed import sol_price_feed
+from utils.cache import AsyncTTLCache
+from utils.capture import capture
 from config import *
 
-solana_client = AsyncClient(RPC_URL)
+# mint -> (supply, decimals). Supply pump-токенов за время позиции практически не меняется
+supply_cache = AsyncTTLCache(maxsize=SUPPLY_CACHE_SIZE, ttl=SUPPLY_CACHE_TTL)
 
 
-async def get_token_supply(token_address: str) -> float | None:
+async def _fetch_token_supply(token_address: str) -> Optional[Tuple[float, int]]:
     try:
-        pubkey = Pubkey.from_string(token_address)
-        response = await solana_client.get_token_supply(pubkey)
-        if response.value:
-            amount = int(response.value.amount)
-            decimals = int(response.value.decimals)
+        result = await transport.rpc_call("getTokenSupply", [token_address])
+        value = result.get("value") if result else None
+        if value:
+            capture.record_token_supply(token_address, result)
+            amount = int(value["amount"])
+            decimals = int(value["decimals"])
             supply = amount / (10 ** decimals)
-            return supply
+            return supply, decimals
         else:
             print("[LOG] Пустой ответ от RPC при получении total supply")
     except Exception as e:
@@ -27,8 +29,21 @@ async def get_token_supply(token_address: str) -> float | None:
     return None
 
 
-async def get_sol_price(session):
-    url = "https://api.binance.com/api/v3/ticker/price?symbol=SOLUSDT"
-    async with session.get(url, timeout=1) as resp:
-        data = await resp.json()
-        return float(data["price"])
\ No newline at end of file
+async def get_token_supply_info(token_address: str) -> Optional[Tuple[float, int]]:
+    """(supply, decimals) минта через TTL-кэш; одновременные запросы одного минта объединяются"""
+    return await supply_cache.get_or_load(token_address, lambda: _fetch_token_supply(token_address))
+
+
+async def get_token_supply(token_address: str) -> float | None:
+    info = await get_token_supply_info(token_address)
+    return info[0] if info else None
+
+
+async def get_token_decimals(token_address: str) -> int | None:
+    info = await get_token_supply_info(token_address)
+    return info[1] if info else None
+
+
+async def get_sol_price(session=None):
+    """Цена SOL/USD из фонового сервиса (чтение из памяти). session оставлен для совместимости"""
+    return await sol_price_feed.get_price()
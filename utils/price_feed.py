@@ -0,0 +1,129 @@
+import asyncio
+import aiohttp
+import json
+import time
+import websockets
+import sys
+import os
+from typing import AsyncIterator, Callable, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transport import transport
+from config import SOL_PRICE_WS_URL, SOL_PRICE_REST_URL, SOL_PRICE_MAX_AGE
+
+
+class SolPriceFeed:
+    """
+    Фоновый сервис цены SOL/USD.
+    Держит последнюю цену в памяти, обновляя её из стрима Binance.
+    Если цена устарела (старше max_age) - один REST-запрос,
+    если и он не удался - отдаём последнее хорошее значение.
+
+    source - необязательная фабрика асинхронного итератора цен,
+    подменяет стрим (например, локальный источник в тестах).
+    """
+
+    def __init__(self, stream_url: str = SOL_PRICE_WS_URL, rest_url: str = SOL_PRICE_REST_URL,
+                 max_age: float = SOL_PRICE_MAX_AGE,
+                 source: Optional[Callable[[], AsyncIterator[float]]] = None):
+        self.stream_url = stream_url
+        self.rest_url = rest_url
+        self.max_age = max_age
+        self.source = source
+
+        self.price: Optional[float] = None
+        self.updated_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()  # первая цена получена
+
+        self.stats = {
+            'stream_updates': 0,   # обновлений из стрима
+            'rest_fetches': 0,     # REST-запросов при устаревшей цене
+            'stale_served': 0      # раз отдали последнее хорошее значение
+        }
+
+    def set_price(self, price: float, ts: Optional[float] = None):
+        """Обновляет цену в памяти"""
+        if price and price > 0:
+            self.price = price
+            self.updated_at = ts if ts is not None else time.time()
+            self._ready.set()
+
+    def is_fresh(self) -> bool:
+        return self.price is not None and time.time() - self.updated_at <= self.max_age
+
+    async def start(self):
+        """Запускает фоновое чтение стрима"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_ready(self, timeout: float) -> Optional[float]:
+        """Ждёт первую цену из стрима; не дождались - обычный get_price (REST)"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await self.get_price()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _stream(self) -> AsyncIterator[float]:
+        """Источник цен: подменённый source или стрим сделок Binance"""
+        if self.source is not None:
+            async for price in self.source():
+                yield price
+            return
+
+        async with websockets.connect(self.stream_url) as ws:
+            print("📈 Стрим цены SOL подключен")
+            async for msg in ws:
+                data = json.loads(msg)
+                price = data.get("p") or data.get("c")
+                if price:
+                    yield float(price)
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async for price in self._stream():
+                    self.set_price(price)
+                    self.stats['stream_updates'] += 1
+                    backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"🔴 Ошибка стрима цены SOL: {e}, переподключение через {backoff:.0f} с")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _fetch_rest(self) -> Optional[float]:
+        session = await transport.get_session()
+        async with session.get(self.rest_url, timeout=aiohttp.ClientTimeout(total=1)) as resp:
+            data = await resp.json(content_type=None)
+            return float(data["price"])
+
+    async def get_price(self) -> Optional[float]:
+        """Цена SOL/USD: из памяти, при устаревании - REST, при ошибке - последнее хорошее значение"""
+        if self.is_fresh():
+            return self.price
+
+        try:
+            self.stats['rest_fetches'] += 1
+            price = await self._fetch_rest()
+            self.set_price(price)
+            return price
+        except Exception as e:
+            if self.price is not None:
+                self.stats['stale_served'] += 1
+                age = time.time() - self.updated_at
+                print(f"⚠️ Цена SOL устарела на {age:.0f} с, используем последнее значение: {e}")
+                return self.price
+            print(f"❌ Нет цены SOL: {e}")
+            return None
+
+
+# Глобальный экземпляр
+sol_price_feed = SolPriceFeed()
@@ -0,0 +1,123 @@
+import signal
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек в духе HDR: значения (мкс) раскладываются по
+    диапазонам-степеням двойки, внутри диапазона - 2**precision_bits
+    линейных ячеек. Относительная ошибка перцентиля не больше 2**-(precision_bits-1),
+    память - несколько сотен счётчиков на весь диапазон от микросекунд до часов.
+    """
+
+    def __init__(self, precision_bits: int = 7):
+        self.precision_bits = precision_bits
+        self.counts: Dict[int, int] = {}  # индекс ячейки -> число значений
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def _index(self, value_us: int) -> int:
+        magnitude = max(0, value_us.bit_length() - self.precision_bits)
+        return (magnitude << self.precision_bits) | (value_us >> magnitude)
+
+    def _value_ms(self, index: int) -> float:
+        """Середина ячейки в мс"""
+        magnitude = index >> self.precision_bits
+        sub = index & ((1 << self.precision_bits) - 1)
+        low = sub << magnitude
+        return (low + ((1 << magnitude) - 1) / 2) / 1000
+
+    def record(self, value_ms: float):
+        value_ms = max(0.0, value_ms)
+        index = self._index(int(value_ms * 1000))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.min_ms = value_ms if self.min_ms is None else min(self.min_ms, value_ms)
+        self.max_ms = value_ms if self.max_ms is None else max(self.max_ms, value_ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, int(self.count * pct / 100 + 0.999999))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Края знаем точно - не выходим за них из-за ширины ячейки
+                return min(self.max_ms, max(self.min_ms, self._value_ms(index)))
+        return self.max_ms
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'min_ms': self.min_ms,
+            'mean_ms': self.total_ms / self.count if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms
+        }
+
+
+class Tracer:
+    """
+    Спаны этапов от поста в канале до покупки. Каждый спан пишется
+    в гистограмму своего этапа; отчёт - по запросу (dump / SIGUSR1).
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.started_at = time.time()
+
+    def record(self, name: str, duration_ms: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(duration_ms)
+
+    def record_since(self, name: str, start: Optional[float], end: Optional[float] = None):
+        """Этап между двумя отметками time.time() (например, пост в канале -> сигнатура в сети)"""
+        if start is None:
+            return
+        self.record(name, ((end if end is not None else time.time()) - start) * 1000)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """with tracer.span('parse'): ... - длительность блока (работает и вокруг await)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def report(self) -> Dict[str, dict]:
+        return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+    def dump(self):
+        """Печатает p50/p95/p99 по всем этапам"""
+        print(f"⏱️ Задержки по этапам (за {time.time() - self.started_at:.0f} с):")
+        if not self.histograms:
+            print("   нет данных")
+            return
+        for name, stats in sorted(self.report().items()):
+            print(f"   {name:<20} n={stats['count']:<6} p50 {stats['p50_ms']:9.1f} мс | "
+                  f"p95 {stats['p95_ms']:9.1f} мс | p99 {stats['p99_ms']:9.1f} мс | max {stats['max_ms']:9.1f} мс")
+
+    def install_signal_handler(self, loop, signum: int = getattr(signal, "SIGUSR1", 0)) -> bool:
+        """Отчёт по сигналу (kill -USR1 <pid>); False, если платформа не поддерживает"""
+        if not signum:
+            return False
+        try:
+            loop.add_signal_handler(signum, self.dump)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
+
+# Глобальный трассировщик
+tracer = Tracer()
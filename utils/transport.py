@@ -0,0 +1,321 @@
+import asyncio
+import aiohttp
+import itertools
+import time
+import sys
+import os
+from collections import deque
+from typing import List, Optional, Union
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (RPC_URLS, HTTP_POOL_LIMIT, HTTP_POOL_PER_HOST, HTTP_KEEPALIVE,
+                    RPC_HEDGE_PERCENTILE, RPC_HEDGE_MIN_MS, RPC_PROBE_EVERY,
+                    WARMUP_CONNECTIONS, KEEP_WARM_INTERVAL)
+
+
+class InvalidRpcResponse(Exception):
+    """Узел ответил, но не JSON-RPC результатом (HTTP != 200, не JSON или объект error)"""
+
+
+class BatchNotSupported(InvalidRpcResponse):
+    """На batch-запрос (массив) узел ответил одним объектом error - batch не принимает"""
+
+
+class RpcEndpoint:
+    """RPC-узел со статистикой задержек и ошибок"""
+
+    def __init__(self, url: str, alpha: float = 0.2):
+        self.url = url
+        self.alpha = alpha
+        self.latencies = deque(maxlen=256)  # мс последних успешных ответов
+        self.ewma_ms: Optional[float] = None
+        self.failure_rate = 0.0             # EWMA доли ошибок
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0                       # сколько раз ответ этого узла был использован
+
+    def _observe(self, latency_ms: float):
+        self.latencies.append(latency_ms)
+        self.ewma_ms = latency_ms if self.ewma_ms is None else self.ewma_ms + self.alpha * (latency_ms - self.ewma_ms)
+
+    def record_success(self, latency_ms: float):
+        self.requests += 1
+        self._observe(latency_ms)
+        self.failure_rate *= (1 - self.alpha)
+
+    def record_slow(self, elapsed_ms: float):
+        """Запрос отменён, потому что другой узел ответил раньше"""
+        self.requests += 1
+        if self.ewma_ms is None or elapsed_ms > self.ewma_ms:
+            self._observe(elapsed_ms)
+
+    def record_failure(self):
+        self.requests += 1
+        self.failures += 1
+        self.failure_rate += self.alpha * (1 - self.failure_rate)
+
+    def score(self) -> float:
+        """Меньше - лучше: сглаженная задержка со штрафом за ошибки"""
+        base = self.ewma_ms if self.ewma_ms is not None else 100.0
+        return base * (1 + 4 * self.failure_rate)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def report(self) -> dict:
+        return {
+            'url': self.url,
+            'requests': self.requests,
+            'failures': self.failures,
+            'wins': self.wins,
+            'ewma_ms': self.ewma_ms,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'failure_rate': self.failure_rate
+        }
+
+
+class Transport:
+    """
+    Общий HTTP/RPC транспорт на весь процесс.
+    Одна aiohttp-сессия с keep-alive пулом: TCP+TLS рукопожатие
+    оплачивается один раз на соединение, а не на каждый запрос.
+
+    JSON-RPC идёт на список узлов RPC_URLS: запрос уходит на узел
+    с лучшим счётом, и если ответа нет дольше его RPC_HEDGE_PERCENTILE
+    задержки - дублируется на следующий. Берётся первый валидный ответ.
+    """
+
+    def __init__(self, rpc_urls: Optional[List[str]] = None):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._request_ids = itertools.count(1)
+        self.endpoints = [RpcEndpoint(url) for url in (rpc_urls or RPC_URLS)]
+        self.hedge_percentile = RPC_HEDGE_PERCENTILE
+        self.hedge_min = RPC_HEDGE_MIN_MS / 1000
+        self.probe_every = RPC_PROBE_EVERY
+        self._requests = 0
+        self.hedges = 0  # сколько раз потребовался дубль
+        self._keep_warm_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Открывает пул соединений (если ещё не открыт)"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+            print("🔗 Пул HTTP-соединений открыт")
+        return self.session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, открывая её при первом обращении"""
+        if self.session is None or self.session.closed:
+            return await self.start()
+        return self.session
+
+    async def close(self):
+        """Закрывает пул соединений"""
+        if self._keep_warm_task:
+            self._keep_warm_task.cancel()
+            self._keep_warm_task = None
+        if self.session and not self.session.closed:
+            await self.session.close()
+            print("🔌 Пул HTTP-соединений закрыт")
+        self.session = None
+
+    def next_id(self) -> int:
+        """Следующий id для JSON-RPC запроса"""
+        return next(self._request_ids)
+
+    def _ranked_endpoints(self) -> List[RpcEndpoint]:
+        """Узлы по возрастанию счёта; изредка первым ставим другой, чтобы обновить его статистику"""
+        ranked = sorted(self.endpoints, key=lambda e: e.score())
+        self._requests += 1
+        if len(ranked) > 1 and self.probe_every and self._requests % self.probe_every == 0:
+            probe = ranked.pop(1 + (self._requests // self.probe_every) % (len(ranked) - 1))
+            ranked.insert(0, probe)
+        return ranked
+
+    def _hedge_delay(self, endpoint: RpcEndpoint) -> float:
+        """Через сколько секунд дублировать запрос на следующий узел"""
+        p = endpoint.percentile(self.hedge_percentile)
+        if p is None:
+            return max(self.hedge_min, 0.2)
+        return max(self.hedge_min, p / 1000)
+
+    async def _post(self, endpoint: RpcEndpoint, payload: Union[dict, list], timeout: float):
+        session = await self.get_session()
+        start = time.monotonic()
+        try:
+            async with session.post(endpoint.url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                if resp.status != 200:
+                    raise InvalidRpcResponse(f"HTTP {resp.status}")
+                try:
+                    data = await resp.json(content_type=None)
+                except ValueError as e:
+                    # HTML-заглушка балансировщика или обрезанное тело с кодом 200
+                    raise InvalidRpcResponse(f"не JSON: {e}") from e
+            if isinstance(data, dict) and "error" in data and "result" not in data:
+                if isinstance(payload, list):
+                    raise BatchNotSupported(str(data["error"]))
+                raise InvalidRpcResponse(str(data["error"]))
+        except asyncio.CancelledError:
+            # Проиграл хеджу: учитываем прошедшее время как нижнюю оценку задержки
+            endpoint.record_slow((time.monotonic() - start) * 1000)
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        endpoint.record_success((time.monotonic() - start) * 1000)
+        return data
+
+    async def rpc_request(self, payload: Union[dict, list], timeout: float = 10) -> Optional[Union[dict, list]]:
+        """
+        Отправляет JSON-RPC запрос (одиночный или batch) с хеджированием по узлам.
+        Возвращает разобранный JSON или None, если все узлы ответили не-результатом.
+        Если все узлы упали по сети/таймауту - пробрасывает последнюю ошибку.
+        BatchNotSupported пробрасывается: вызывающий переходит на одиночные запросы.
+        """
+        ranked = self._ranked_endpoints()
+        if len(ranked) == 1:
+            try:
+                return await self._post(ranked[0], payload, timeout)
+            except BatchNotSupported:
+                raise
+            except InvalidRpcResponse:
+                return None
+
+        pending = set()
+        owners = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+        invalid = False
+        batch_error: Optional[BatchNotSupported] = None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        def launch():
+            nonlocal next_index
+            endpoint = ranked[next_index]
+            next_index += 1
+            task = asyncio.ensure_future(self._post(endpoint, payload, timeout))
+            owners[task] = endpoint
+            pending.add(task)
+            return endpoint
+
+        try:
+            hedge_after = self._hedge_delay(launch())
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                can_hedge = next_index < len(ranked)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=min(hedge_after, remaining) if can_hedge else remaining,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Узел медлит дольше обычного - дублируем запрос на следующий
+                    self.hedges += 1
+                    hedge_after = self._hedge_delay(launch())
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        owners[task].wins += 1
+                        return task.result()
+                    if isinstance(task.exception(), BatchNotSupported):
+                        batch_error = task.exception()
+                    elif isinstance(task.exception(), InvalidRpcResponse):
+                        invalid = True
+                    else:
+                        last_error = task.exception()
+                # Ответ с ошибкой - сразу пробуем следующий узел, не дожидаясь порога
+                if not pending and next_index < len(ranked):
+                    hedge_after = self._hedge_delay(launch())
+            timed_out = bool(pending)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if invalid:
+            return None
+        if batch_error is not None and not timed_out:
+            # Batch отклонили все ответившие узлы
+            raise batch_error
+        if timed_out or last_error is None:
+            raise asyncio.TimeoutError()
+        raise last_error
+
+    async def _ping(self, endpoint: RpcEndpoint, record: bool) -> float:
+        """getHealth на узел; время в мс. Холодный пинг (DNS+TCP+TLS) в статистику узла не пишем"""
+        payload = {"jsonrpc": "2.0", "id": self.next_id(), "method": "getHealth"}
+        if record:
+            start = time.monotonic()
+            await self._post(endpoint, payload, timeout=5)
+            return (time.monotonic() - start) * 1000
+        session = await self.get_session()
+        start = time.monotonic()
+        async with session.post(endpoint.url, json=payload, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            await resp.read()
+        return (time.monotonic() - start) * 1000
+
+    async def warm_up(self, connections: int = WARMUP_CONNECTIONS) -> List[dict]:
+        """
+        Открывает по connections соединений на каждый RPC-узел (одновременные
+        пинги - отдельные соединения в пуле) и снимает первую тёплую задержку.
+        Возвращает по узлу: cold_ms (с рукопожатием), warm_ms или error.
+        """
+        async def warm(endpoint: RpcEndpoint) -> dict:
+            try:
+                cold = await asyncio.gather(*(self._ping(endpoint, record=False)
+                                              for _ in range(max(1, connections))))
+                warm_ms = await self._ping(endpoint, record=True)
+                return {'url': endpoint.url, 'cold_ms': max(cold), 'warm_ms': warm_ms}
+            except Exception as e:
+                return {'url': endpoint.url, 'error': str(e) or type(e).__name__}
+
+        reports = await asyncio.gather(*(warm(endpoint) for endpoint in self.endpoints))
+        if KEEP_WARM_INTERVAL > 0 and self._keep_warm_task is None:
+            self._keep_warm_task = asyncio.create_task(self._keep_warm(KEEP_WARM_INTERVAL))
+        return list(reports)
+
+    async def _keep_warm(self, interval: float):
+        """Пингует узлы чаще, чем истекает keep-alive, чтобы первый запрос после простоя не платил за рукопожатие"""
+        while True:
+            await asyncio.sleep(interval)
+            for endpoint in self.endpoints:
+                try:
+                    await self._ping(endpoint, record=True)
+                except Exception:
+                    pass
+
+    def endpoint_report(self) -> List[dict]:
+        """Здоровье и задержки по каждому RPC-узлу"""
+        return [endpoint.report() for endpoint in self.endpoints]
+
+    async def rpc_call(self, method: str, params: list, timeout: float = 10):
+        """Вызывает один JSON-RPC метод и возвращает поле result (или None)"""
+        payload = {
+            "jsonrpc": "2.0",
+            "id": self.next_id(),
+            "method": method,
+            "params": params
+        }
+        data = await self.rpc_request(payload, timeout=timeout)
+        if not data:
+            return None
+        return data.get("result")
+
+
+# Глобальный экземпляр
+transport = Transport()
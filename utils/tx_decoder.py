@@ -0,0 +1,138 @@
+from typing import Optional
+
+WSOL_MINT = "So11111111111111111111111111111111111111112"
+
+
+class SwapResult:
+    """Результат разбора свапа нашего кошелька (покупка или продажа)"""
+    __slots__ = ('direction', 'signature', 'token_address', 'token_amount', 'sol_wallet', 'sol_pure')
+
+    def __init__(self, direction: str, signature: str, token_address: str, token_amount: float,
+                 sol_wallet: float, sol_pure: Optional[float]):
+        self.direction = direction          # 'buy' | 'sell'
+        self.signature = signature
+        self.token_address = token_address
+        self.token_amount = token_amount    # всегда положительное
+        self.sol_wallet = sol_wallet        # изменение SOL на кошельке (с комиссиями)
+        self.sol_pure = sol_pure            # SOL, ушедший/пришедший в самом свапе
+
+    def to_dict(self) -> dict:
+        """Формат tx_info, который ждут TokenMonitor и WizardTrader"""
+        if self.direction == "buy":
+            return {
+                "direction": "buy",
+                "signature": self.signature,
+                "token_address": self.token_address,
+                "token_amount": self.token_amount,
+                "sol_spent_wallet": abs(self.sol_wallet),
+                "sol_spent_pure": self.sol_pure
+            }
+        return {
+            "direction": "sell",
+            "signature": self.signature,
+            "token_address": self.token_address,
+            "token_amount": self.token_amount,
+            "sol_received_wallet": self.sol_wallet,
+            "sol_received_pure": self.sol_pure
+        }
+
+
+def _ui_amount(balance: dict) -> float:
+    return float(balance.get("uiTokenAmount", {}).get("uiAmountString") or 0.0)
+
+
+def decode_swap(result: dict, signature: str, wallet: str) -> Optional[SwapResult]:
+    """
+    Разбирает результат getTransaction (jsonParsed) за один проход по каждой
+    секции meta и возвращает SwapResult для wallet или None.
+
+    - accountKeys: индекс кошелька -> изменение SOL по кошельку;
+    - preTokenBalances: балансы кошелька по минтам и балансы всех счетов по accountIndex;
+    - postTokenBalances: дельты кошелька по минтам и первое уменьшение wSOL
+      на чужом счёте (SOL, который пул отдал нам при продаже);
+    - innerInstructions: перевод wSOL от кошелька (чистый SOL покупки),
+      временные wSOL-счета кошелька и переводы wSOL на них (запасной путь для продажи).
+    """
+    meta = result.get("meta")
+    if not meta or meta.get("err"):
+        return None
+
+    try:
+        wallet_index = -1
+        for i, key in enumerate(result["transaction"]["message"]["accountKeys"]):
+            if key["pubkey"] == wallet:
+                wallet_index = i
+                break
+        if wallet_index < 0:
+            return None
+        sol_change = (meta["postBalances"][wallet_index] - meta["preBalances"][wallet_index]) / 1e9
+    except (KeyError, IndexError, TypeError):
+        return None
+
+    # ---------- preTokenBalances ----------
+    wallet_pre = {}     # mint -> баланс кошелька
+    pre_by_index = {}   # accountIndex -> баланс (только с известной суммой)
+    for balance in meta.get("preTokenBalances", []):
+        amount = _ui_amount(balance)
+        if balance.get("owner") == wallet:
+            wallet_pre[balance["mint"]] = amount
+        if balance.get("uiTokenAmount", {}).get("uiAmountString"):
+            pre_by_index[balance.get("accountIndex")] = amount
+
+    # ---------- postTokenBalances ----------
+    token_mint = None
+    token_delta = 0.0
+    pool_wsol_out = None  # первое уменьшение wSOL на чужом счёте
+    for balance in meta.get("postTokenBalances", []):
+        mint = balance["mint"]
+        owner = balance.get("owner")
+        amount = _ui_amount(balance)
+
+        if owner == wallet:
+            # wSOL кошелька - это расчётная валюта, а не торгуемый токен
+            if token_mint is None and mint != WSOL_MINT:
+                delta = amount - wallet_pre.get(mint, 0.0)
+                if (delta > 0 and sol_change < 0) or delta < 0:
+                    token_mint, token_delta = mint, delta
+        elif pool_wsol_out is None and mint == WSOL_MINT:
+            pre_amount = pre_by_index.get(balance.get("accountIndex"))
+            if pre_amount is not None and amount - pre_amount < -1e-9:
+                pool_wsol_out = pre_amount - amount
+
+    if token_mint is None:
+        return None
+    direction = "buy" if token_delta > 0 else "sell"
+
+    # ---------- innerInstructions ----------
+    wallet_wsol_in = None   # перевод wSOL с authority = кошелёк (покупка)
+    temp_wsol_accounts = set()
+    wsol_transfers = []     # (destination, amount) для переводов wSOL
+    for group in meta.get("innerInstructions", []):
+        for inst in group.get("instructions", []):
+            parsed = inst.get("parsed")
+            if not isinstance(parsed, dict):
+                continue
+            kind = parsed.get("type")
+            info = parsed.get("info", {})
+            if kind == "transferChecked" and inst.get("program") == "spl-token":
+                if info.get("mint") != WSOL_MINT:
+                    continue
+                amount = float(info.get("tokenAmount", {}).get("uiAmount") or 0.0)
+                if wallet_wsol_in is None and info.get("authority") == wallet:
+                    wallet_wsol_in = amount
+                wsol_transfers.append((info.get("destination"), amount))
+            elif kind in ("initializeAccount", "initializeAccount3"):
+                if info.get("owner") == wallet and info.get("mint") == WSOL_MINT:
+                    temp_wsol_accounts.add(info.get("account"))
+
+    if direction == "buy":
+        return SwapResult("buy", signature, token_mint, token_delta, sol_change, wallet_wsol_in)
+
+    sol_received = pool_wsol_out
+    if sol_received is None and temp_wsol_accounts:
+        for destination, amount in wsol_transfers:
+            if destination in temp_wsol_accounts:
+                sol_received = amount
+                break
+    return SwapResult("sell", signature, token_mint, abs(token_delta), sol_change,
+                      sol_received if sol_received is not None else 0.0)
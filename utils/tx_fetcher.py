@@ -0,0 +1,274 @@
+import asyncio
+import aiohttp
+import random
+import time
+import sys
+import os
+from collections import deque
+from typing import Dict, List, Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transport import transport, BatchNotSupported
+from utils.capture import capture
+from config import TX_BATCH_WINDOW_MS, TX_BATCH_MAX, TX_RETRY_BASE_MS, TX_RETRY_MAX_MS, TX_FETCH_TIMEOUT
+
+# getSignatureStatuses принимает до 256 сигнатур за вызов
+STATUS_BATCH_MAX = 256
+LANDED_STATUSES = ("confirmed", "finalized")
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class TransactionFetcher:
+    """
+    Micro-batching загрузчик getTransaction с адаптивными повторами.
+
+    1. Первая попытка - сразу getTransaction: уведомление пришло на confirmed,
+       обычно транзакция уже доступна. Сигнатуры за короткое окно уходят
+       одним JSON-RPC batch-запросом.
+    2. Если транзакции ещё нет - сигнатура переходит в опрос дешёвого
+       getSignatureStatuses (один вызов на все ожидающие сигнатуры)
+       с экспоненциальной паузой и джиттером.
+    3. Как только статус confirmed/finalized - снова getTransaction.
+    Время каждого RPC-вызова пишется для статистики задержек.
+    """
+
+    def __init__(self, window: float = TX_BATCH_WINDOW_MS / 1000, max_batch: int = TX_BATCH_MAX,
+                 retry_base: float = TX_RETRY_BASE_MS / 1000, retry_max: float = TX_RETRY_MAX_MS / 1000,
+                 timeout: float = TX_FETCH_TIMEOUT):
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.timeout = timeout
+
+        self.waiters: Dict[str, List[asyncio.Future]] = {}  # signature -> ожидающие
+        self.attempts: Dict[str, int] = {}                  # signature -> число повторов
+        self.started: Dict[str, float] = {}                 # signature -> время первого запроса
+        self.queue: List[str] = []                          # сигнатуры для следующего batch getTransaction
+        self.status_queue: List[str] = []                   # сигнатуры для следующего getSignatureStatuses
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._status_handle: Optional[asyncio.TimerHandle] = None
+        self.batch_supported = True  # некоторые провайдеры не принимают batch-запросы
+
+        self.stats = {
+            'batches': 0,        # HTTP-запросов getTransaction
+            'requested': 0,      # сигнатур запрошено (с учётом повторов)
+            'requeued': 0,       # повторов для ещё не доступных транзакций
+            'coalesced': 0,      # запросов, присоединившихся к уже ожидаемой сигнатуре
+            'status_polls': 0,   # вызовов getSignatureStatuses
+            'failed_onchain': 0, # транзакций с ошибкой по статусу (getTransaction не нужен)
+            'timeouts': 0        # сигнатур, так и не дождавшихся транзакции
+        }
+        # Задержки в мс: каждого RPC-вызова и от запроса до результата
+        self.latency_ms = {
+            'getTransaction': deque(maxlen=2048),
+            'getSignatureStatuses': deque(maxlen=2048),
+            'fetch': deque(maxlen=2048)
+        }
+        self.attempts_histogram: Dict[int, int] = {}  # повторов до результата -> количество
+
+    async def fetch(self, signature: str) -> Optional[dict]:
+        """Возвращает result из getTransaction или None (ошибка транзакции / таймаут)"""
+        future = asyncio.get_running_loop().create_future()
+        waiters = self.waiters.get(signature)
+        if waiters is not None:
+            waiters.append(future)
+            self.stats['coalesced'] += 1
+        else:
+            self.waiters[signature] = [future]
+            self.attempts[signature] = 0
+            self.started[signature] = time.monotonic()
+            self._schedule(signature)
+        return await future
+
+    # ---------- getTransaction ----------
+
+    def _schedule(self, signature: str):
+        """Ставит сигнатуру в ближайший batch getTransaction"""
+        if signature not in self.waiters:
+            return
+        self.queue.append(signature)
+        if len(self.queue) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    def _flush(self):
+        """Отправляет накопленные сигнатуры пачками по max_batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self.queue:
+            batch, self.queue = self.queue[:self.max_batch], self.queue[self.max_batch:]
+            asyncio.create_task(self._send_batch(batch))
+
+    def _build_request(self, request_id: int, signature: str) -> dict:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "getTransaction",
+            "params": [
+                signature,
+                {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
+            ]
+        }
+
+    async def _timed_request(self, method: str, payload):
+        start = time.monotonic()
+        try:
+            return await transport.rpc_request(payload, timeout=10)
+        finally:
+            self.latency_ms[method].append((time.monotonic() - start) * 1000)
+
+    async def _request(self, batch: List[str]) -> Dict[str, Optional[dict]]:
+        """Запрашивает транзакции и возвращает signature -> result"""
+        results = {}
+        if self.batch_supported and len(batch) > 1:
+            ids = {transport.next_id(): signature for signature in batch}
+            payload = [self._build_request(request_id, signature) for request_id, signature in ids.items()]
+            self.stats['batches'] += 1
+            try:
+                data = await self._timed_request('getTransaction', payload)
+            except BatchNotSupported as e:
+                # Только явный отказ от batch выключает его; 429/5xx - временные, их добирают повторы
+                print(f"⚠️ RPC не поддерживает batch-запросы ({e}), переключаемся на одиночные")
+                self.batch_supported = False
+            else:
+                if isinstance(data, list):
+                    for item in data:
+                        signature = ids.get(item.get("id")) if isinstance(item, dict) else None
+                        if signature:
+                            results[signature] = item.get("result")
+                return results
+
+        # Одиночные запросы - параллельно, ошибка одного не мешает остальным
+        self.stats['batches'] += len(batch)
+        responses = await asyncio.gather(
+            *(self._timed_request('getTransaction', self._build_request(transport.next_id(), signature))
+              for signature in batch),
+            return_exceptions=True
+        )
+        for signature, data in zip(batch, responses):
+            results[signature] = data.get("result") if isinstance(data, dict) else None
+        return results
+
+    async def _send_batch(self, batch: List[str]):
+        self.stats['requested'] += len(batch)
+        try:
+            results = await self._request(batch)
+        except Exception as e:
+            # Любой сбой (сеть, таймаут, мусор вместо JSON) - в повторы, иначе ожидающие повиснут навсегда
+            if not isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                print(f"⚠️ getTransaction: {type(e).__name__}: {e}")
+            results = {}
+
+        for signature in batch:
+            result = results.get(signature)
+            if result:
+                self._resolve(signature, result)
+            else:
+                self._retry(signature)
+
+    # ---------- getSignatureStatuses ----------
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная пауза с джиттером: [d/2, d], d = base * 2^attempt (не больше retry_max)"""
+        delay = min(self.retry_max, self.retry_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry(self, signature: str):
+        """Транзакция ещё недоступна - ждём её через опрос статуса"""
+        if signature not in self.waiters:
+            return
+        if time.monotonic() - self.started.get(signature, 0) >= self.timeout:
+            self.stats['timeouts'] += 1
+            self._resolve(signature, None)
+            return
+        attempt = self.attempts.get(signature, 0)
+        self.attempts[signature] = attempt + 1
+        self.stats['requeued'] += 1
+        asyncio.get_running_loop().call_later(self._backoff(attempt), self._schedule_status, signature)
+
+    def _schedule_status(self, signature: str):
+        if signature not in self.waiters:
+            return
+        self.status_queue.append(signature)
+        if len(self.status_queue) >= STATUS_BATCH_MAX:
+            self._flush_status()
+        elif self._status_handle is None:
+            self._status_handle = asyncio.get_running_loop().call_later(self.window, self._flush_status)
+
+    def _flush_status(self):
+        if self._status_handle is not None:
+            self._status_handle.cancel()
+            self._status_handle = None
+        while self.status_queue:
+            batch, self.status_queue = self.status_queue[:STATUS_BATCH_MAX], self.status_queue[STATUS_BATCH_MAX:]
+            asyncio.create_task(self._poll_statuses(batch))
+
+    async def _poll_statuses(self, batch: List[str]):
+        """Один getSignatureStatuses на все ожидающие сигнатуры"""
+        self.stats['status_polls'] += 1
+        payload = {
+            "jsonrpc": "2.0",
+            "id": transport.next_id(),
+            "method": "getSignatureStatuses",
+            "params": [batch, {"searchTransactionHistory": False}]
+        }
+        try:
+            data = await self._timed_request('getSignatureStatuses', payload)
+            statuses = ((data or {}).get("result") or {}).get("value") or []
+        except Exception as e:
+            if not isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                print(f"⚠️ getSignatureStatuses: {type(e).__name__}: {e}")
+            statuses = []
+
+        for i, signature in enumerate(batch):
+            status = statuses[i] if i < len(statuses) else None
+            if not status:
+                self._retry(signature)
+            elif status.get("err"):
+                # Транзакция упала - разбирать нечего
+                self.stats['failed_onchain'] += 1
+                self._resolve(signature, None)
+            elif status.get("confirmationStatus") in LANDED_STATUSES:
+                self._schedule(signature)
+            else:
+                self._retry(signature)
+
+    # ---------- результат ----------
+
+    def _resolve(self, signature: str, result: Optional[dict]):
+        attempts = self.attempts.pop(signature, 0)
+        started = self.started.pop(signature, None)
+        if result is not None:
+            capture.record_transaction(signature, result)
+            self.attempts_histogram[attempts] = self.attempts_histogram.get(attempts, 0) + 1
+            if started is not None:
+                self.latency_ms['fetch'].append((time.monotonic() - started) * 1000)
+        for future in self.waiters.pop(signature, []):
+            if not future.done():
+                future.set_result(result)
+
+    def latency_report(self) -> dict:
+        """p50/p95/p99 (мс) по последним вызовам и распределение числа повторов"""
+        report = {}
+        for name, values in self.latency_ms.items():
+            values = list(values)
+            report[name] = {
+                'count': len(values),
+                'p50': _percentile(values, 50),
+                'p95': _percentile(values, 95),
+                'p99': _percentile(values, 99)
+            }
+        report['attempts'] = dict(sorted(self.attempts_histogram.items()))
+        return report
+
+
+# Глобальный экземпляр
+tx_fetcher = TransactionFetcher()